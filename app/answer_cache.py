@@ -0,0 +1,103 @@
+# app/answer_cache.py
+import asyncio
+import re
+import sys
+import time
+from collections import OrderedDict
+from .config import ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_BYTES
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+def normalize_question(question: str) -> str:
+    """Case, punctuation and spacing folded away: "How many iPhones?" == "how many iphones"."""
+    return " ".join(_NON_WORD.sub(" ", str(question or "").casefold()).split())
+
+class AnswerCache:
+    """LRU + TTL cache of LLM answers, keyed by normalized question and snapshot version.
+
+    Only one snapshot version is ever cached: the first lookup against a newer
+    version drops everything, so answers never outlive the data they came from.
+    Concurrent misses for the same question share a single computation.
+    """
+
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, max_bytes=ANSWER_CACHE_MAX_BYTES):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.version = None
+        self._entries = OrderedDict()   # question -> (expires_at, answer, size)
+        self._pending = {}              # question -> future for an answer being computed
+        self.bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "invalidations": 0}
+
+    def _sync_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self.counters["invalidations"] += 1
+            self._entries.clear()
+            self._pending.clear()
+            self.bytes = 0
+            self.version = version
+
+    def _discard(self, question):
+        _, _, size = self._entries.pop(question)
+        self.bytes -= size
+
+    def get(self, question, version):
+        self._sync_version(version)
+        entry = self._entries.get(question)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._discard(question)
+            return None
+        self._entries.move_to_end(question)
+        return entry[1]
+
+    def put(self, question, version, answer):
+        self._sync_version(version)
+        size = sys.getsizeof(question) + sys.getsizeof(answer)
+        if self.maxsize <= 0 or size > self.max_bytes:
+            return
+        if question in self._entries:
+            self._discard(question)
+        self._entries[question] = (time.monotonic() + self.ttl, answer, size)
+        self.bytes += size
+        while len(self._entries) > self.maxsize or self.bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+
+    async def get_or_compute(self, question, version, compute, cacheable=lambda answer: True):
+        """Cached answer for ``question``, or ``await compute()`` (stored if ``cacheable``)."""
+        question = normalize_question(question)
+        answer = self.get(question, version)
+        if answer is not None:
+            self.counters["hits"] += 1
+            return answer
+        pending = self._pending.get(question)
+        if pending is not None:
+            self.counters["coalesced"] += 1
+            await asyncio.wait([pending])
+            if not pending.cancelled():
+                return pending.result()
+            # The first caller failed; try again on our own
+        self.counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[question] = future
+        try:
+            answer = await compute()
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            if self._pending.get(question) is future:
+                del self._pending[question]
+        future.set_result(answer)
+        if cacheable(answer):
+            self.put(question, version, answer)
+        return answer
+
+    def stats(self):
+        return {**self.counters, "entries": len(self._entries), "bytes": self.bytes, "version": self.version}
+
+answer_cache = AnswerCache()
@@ -0,0 +1,326 @@
+# app/asset_store.py
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ASSET_FIELDS = ("id", "name", "asset_tag", "serial", "model", "model_id", "category", "status",
+                "assigned_to", "location", "last_checkout", "updated_at", "custom_fields")
+
+# Fields that repeat across thousands of assets: each distinct value is stored once and
+# every asset holds a 4-byte code for it
+DICTIONARY_FIELDS = ("model", "model_id", "category", "status", "assigned_to", "location", "last_checkout",
+                     "updated_at")
+# Fields that are (nearly) unique per asset, kept as plain interned strings
+PLAIN_FIELDS = ("name", "asset_tag", "serial")
+
+# Fields with a hash index, and whether a value maps to one asset or many
+UNIQUE_INDEXES = ("id", "asset_tag")
+MULTI_INDEXES = ("serial", "assigned_to", "location", "category", "model", "status")
+
+def index_key(field, value):
+    """Normalize a value the same way for indexing and lookup."""
+    if value is None:
+        return None
+    if field == "id":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+    key = str(value).strip()
+    # upper()/casefold() always copy; hand back the original string when it is already normalized
+    normalized = key.upper() if field in ("asset_tag", "serial") else key.casefold()
+    return key if normalized == key else normalized
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def fieldset_field_names(fields) -> List[str]:
+    """Field names from a fieldset's ``fields``, as Snipe-IT returns them ({"total", "rows"}) or as a list."""
+    if isinstance(fields, dict):
+        fields = fields.get("rows") or []
+    return [field.get("name") if isinstance(field, dict) else field for field in fields or ()]
+
+def fields_by_model(models, fieldsets) -> Dict[object, Tuple[str, ...]]:
+    """Custom field names each model's fieldset defines, by model id."""
+    names_by_fieldset = {fieldset.get("id"): tuple(fieldset_field_names(fieldset.get("fields")))
+                         for fieldset in fieldsets}
+    return {model.get("id"): names_by_fieldset.get(model.get("fieldset_id"), ()) for model in models}
+
+def custom_value(field):
+    # Snipe-IT sends {"field": ..., "value": ..., "field_format": ...}; only the value is kept
+    return field.get("value") if isinstance(field, dict) else field
+
+class _DictionaryColumn:
+    """Values stored once each, with a code per row pointing at them."""
+    __slots__ = ("codes", "values", "_codes_by_value")
+
+    def __init__(self):
+        self.codes = array("I")
+        self.values = []
+        self._codes_by_value = {}
+
+    def encode(self, value):
+        value = _intern(value)
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = self._codes_by_value[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def copy(self):
+        column = _DictionaryColumn()
+        column.codes = array("I", self.codes)
+        column.values = list(self.values)
+        column._codes_by_value = dict(self._codes_by_value)
+        return column
+
+def _add_row(index, key, row):
+    rows = index.get(key)
+    if rows is None:
+        index[key] = row
+    elif isinstance(rows, int):
+        index[key] = array("I", (rows, row))
+    else:
+        rows.append(row)
+
+def _rows(entry):
+    if entry is None:
+        return ()
+    return (entry,) if isinstance(entry, int) else entry
+
+class AssetRecord:
+    """One asset: a view onto a row of an AssetStore's columns.
+
+    Records are created on demand and hold no data of their own, so a store of
+    100k assets is not 100k objects. Compare them by ``id``, not identity.
+    """
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "AssetStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getattr__(self, field):
+        if field == "custom_fields":
+            return self.custom_values()
+        try:
+            return self._store._columns[field][self._row]
+        except KeyError:
+            raise AttributeError(field) from None
+
+    def custom_values(self) -> Dict[str, object]:
+        """Custom field label -> value, for the fields in this asset's model fieldset."""
+        store, row = self._store, self._row
+        return dict(zip(store._custom_layouts[row], store._custom_values[row]))
+
+    def get(self, field, default=None):
+        # Lets code written against the old asset dicts keep using .get()
+        value = getattr(self, field, None)
+        return default if value is None else value
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in ASSET_FIELDS}
+
+    def __eq__(self, other):
+        return isinstance(other, AssetRecord) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"AssetRecord(id={self.id!r}, asset_tag={self.asset_tag!r}, name={self.name!r})"
+
+class AssetStore:
+    """Assets in columns, with hash indexes on the fields the bot looks things up by.
+
+    Repeating fields (category, model, status, location, ...) are dictionary
+    encoded, ids live in a typed array, and custom fields are projected once
+    onto the fields of each asset's model fieldset. Lookups cost O(1) for
+    unique fields and O(matches) for the rest. The store is immutable once
+    built; use ``merged`` to get a new store with changes.
+    """
+
+    def __init__(self, assets: Iterable = (), custom_fields_by_model: Optional[Dict] = None):
+        self.custom_fields_by_model = custom_fields_by_model
+        self._columns = {field: _DictionaryColumn() for field in DICTIONARY_FIELDS}
+        self._columns.update({field: [] for field in PLAIN_FIELDS})
+        self._columns["id"] = array("q")
+        self._custom_layouts = _DictionaryColumn()   # tuple of labels, shared by every asset with that layout
+        self._custom_values: List[tuple] = []
+        self._length = 0
+        for asset in assets:
+            self._append(asset.to_dict() if isinstance(asset, AssetRecord) else asset)
+        self._build_indexes()
+
+    def _append(self, asset: Dict):
+        asset_id = asset.get("id")
+        if not isinstance(asset_id, int) and not isinstance(self._columns["id"], list):
+            self._columns["id"] = list(self._columns["id"])  # non-integer ids: fall back to a list
+        self._columns["id"].append(asset_id)
+        for field in PLAIN_FIELDS:
+            self._columns[field].append(asset.get(field))
+        for field in DICTIONARY_FIELDS:
+            self._columns[field].append(asset.get(field))
+
+        layout, values = self._project_custom_fields(asset)
+        self._custom_layouts.append(layout)
+        self._custom_values.append(values)
+        self._length += 1
+
+    def _project_custom_fields(self, asset: Dict) -> Tuple[tuple, tuple]:
+        """(labels, values) of the asset's custom fields that its model's fieldset defines."""
+        custom = asset.get("custom_fields") or {}
+        labels = None
+        if self.custom_fields_by_model is not None:
+            labels = self.custom_fields_by_model.get(asset.get("model_id"))
+        if not labels:
+            # Unknown model or a fieldset we couldn't read: keep whatever Snipe-IT sent
+            labels = tuple(custom)
+        labels = tuple(label for label in labels if label in custom)
+        return tuple(_intern(label) for label in labels), tuple(custom_value(custom[label]) for label in labels)
+
+    def is_current(self, asset: Dict) -> bool:
+        """True if the store already holds ``asset`` exactly as given."""
+        row = self._unique["id"].get(index_key("id", asset.get("id")))
+        if row is None:
+            return False
+        for field in ASSET_FIELDS:
+            if field != "custom_fields" and self._columns[field][row] != asset.get(field):
+                return False
+        return (self._custom_layouts[row], self._custom_values[row]) == self._project_custom_fields(asset)
+
+    def _build_indexes(self):
+        # Index values are row numbers: an int for a single row, an array("I") once a key has
+        # several. One int object per row is shared by every index.
+        rows = list(range(self._length))
+        self._unique: Dict[str, Dict] = {field: {} for field in UNIQUE_INDEXES}
+        self._multi: Dict[str, Dict[object, object]] = {field: {} for field in MULTI_INDEXES}
+        for field in UNIQUE_INDEXES:
+            index, column = self._unique[field], self._columns[field]
+            for row in rows:
+                key = index_key(field, column[row])
+                if key is not None:
+                    index[key] = row
+        for field in MULTI_INDEXES:
+            index, column = self._multi[field], self._columns[field]
+            if isinstance(column, _DictionaryColumn):
+                # Normalize each distinct value once, then bucket rows by code
+                keys = [index_key(field, value) for value in column.values]
+                for row, code in zip(rows, column.codes):
+                    if keys[code]:
+                        _add_row(index, keys[code], row)
+            else:
+                for row in rows:
+                    key = index_key(field, column[row])
+                    if key:
+                        _add_row(index, key, row)
+
+        self.synced_until = max((value or "" for value in self._columns["updated_at"].values), default="")
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return (AssetRecord(self, row) for row in range(self._length))
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [AssetRecord(self, row) for row in range(self._length)[item]]
+        if item < 0:
+            item += self._length
+        if not 0 <= item < self._length:
+            raise IndexError("asset index out of range")
+        return AssetRecord(self, item)
+
+    def get_by(self, field, value) -> Optional[AssetRecord]:
+        """Single asset for a unique field (id, asset_tag), or the first match for any other."""
+        key = index_key(field, value)
+        if field in self._unique:
+            row = self._unique[field].get(key)
+            return AssetRecord(self, row) if row is not None else None
+        rows = _rows(self._multi[field].get(key))
+        return AssetRecord(self, rows[0]) if rows else None
+
+    def by_id(self, asset_id) -> Optional[AssetRecord]:
+        return self.get_by("id", asset_id)
+
+    def by_tag(self, asset_tag) -> Optional[AssetRecord]:
+        return self.get_by("asset_tag", asset_tag)
+
+    def by_serial(self, serial) -> Optional[AssetRecord]:
+        return self.get_by("serial", serial)
+
+    def find(self, field, value) -> List[AssetRecord]:
+        """All assets whose ``field`` matches ``value`` (case-insensitive)."""
+        key = index_key(field, value)
+        if field in self._unique:
+            row = self._unique[field].get(key)
+            return [AssetRecord(self, row)] if row is not None else []
+        return [AssetRecord(self, row) for row in _rows(self._multi[field].get(key))]
+
+    def count(self, field, value) -> int:
+        key = index_key(field, value)
+        if field in self._unique:
+            return int(key in self._unique[field])
+        return len(_rows(self._multi[field].get(key)))
+
+    def custom_field_labels(self) -> List[str]:
+        """Every custom field label held by some asset, in first-seen order."""
+        labels = {}
+        for layout in self._custom_layouts.values:
+            labels.update(dict.fromkeys(layout))
+        return list(labels)
+
+    def counts(self, field) -> Dict[str, int]:
+        """Number of assets per distinct value of an indexed field, in O(distinct values)."""
+        column = self._columns[field]
+        return {column[rows[0]]: len(rows) for rows in map(_rows, self._multi[field].values())}
+
+    def merged(self, changed_assets: Iterable[Dict], custom_fields_by_model: Optional[Dict] = None) -> "AssetStore":
+        """New store with changed assets replaced in place and new ones appended.
+
+        Unchanged rows are copied column by column, without going back through dicts.
+        """
+        changed_by_id = {}
+        for asset in changed_assets:
+            asset = asset.to_dict() if isinstance(asset, AssetRecord) else asset
+            changed_by_id[index_key("id", asset.get("id"))] = asset
+        if not changed_by_id:
+            return self
+
+        store = AssetStore.__new__(AssetStore)
+        store.custom_fields_by_model = (custom_fields_by_model if custom_fields_by_model is not None
+                                        else self.custom_fields_by_model)
+        store._columns = {field: self._columns[field].copy() for field in DICTIONARY_FIELDS}
+        store._columns.update({field: list(self._columns[field]) for field in PLAIN_FIELDS})
+        ids = self._columns["id"]
+        store._columns["id"] = array("q", ids) if isinstance(ids, array) else list(ids)
+        store._custom_layouts = self._custom_layouts.copy()
+        store._custom_values = list(self._custom_values)
+        store._length = self._length
+
+        replaced = AssetStore([], store.custom_fields_by_model)
+        rows_to_replace = []
+        for asset_id, asset in list(changed_by_id.items()):
+            row = self._unique["id"].get(asset_id)
+            if row is not None:
+                replaced._append(asset)
+                rows_to_replace.append(row)
+                del changed_by_id[asset_id]
+        for position, row in enumerate(rows_to_replace):
+            for field in PLAIN_FIELDS:
+                store._columns[field][row] = replaced._columns[field][position]
+            for field in DICTIONARY_FIELDS:
+                store._columns[field].codes[row] = store._columns[field].encode(replaced._columns[field][position])
+            store._custom_layouts.codes[row] = store._custom_layouts.encode(replaced._custom_layouts[position])
+            store._custom_values[row] = replaced._custom_values[position]
+        for asset in changed_by_id.values():
+            store._append(asset)
+        store._build_indexes()
+        return store
@@ -1,16 +1,59 @@
 # app/azure_auth.py
-import httpx
-from .config import AZURE_BOT_APP_ID, AZURE_BOT_APP_PASSWORD
+import asyncio
+import logging
+import time
+from .config import AZURE_BOT_APP_ID, AZURE_BOT_APP_PASSWORD, AZURE_TOKEN_REFRESH_AHEAD, AZURE_AUTH_URL
+from .http_client import get_http_client
+from .metrics import span
 
-async def get_azure_auth_token():
-    auth_url = "https://login.microsoftonline.com/botframework.com/oauth2/v2.0/token"
+logger = logging.getLogger(__name__)
+
+# Never hand out a token this close to expiry, even while a refresh is running
+MIN_TOKEN_LIFETIME = 30
+
+_token = None
+_expires_at = 0.0
+_refresh_task = None
+
+async def _fetch_token():
+    global _token, _expires_at
     data = {
         'grant_type': 'client_credentials',
         'client_id': AZURE_BOT_APP_ID,
         'client_secret': AZURE_BOT_APP_PASSWORD,
         'scope': 'https://api.botframework.com/.default'
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(auth_url, data=data)
-        response.raise_for_status()
-        return response.json().get('access_token')
+    with span("token_fetch"):
+        response = await get_http_client().post(AZURE_AUTH_URL, data=data)
+    response.raise_for_status()
+    payload = response.json()
+    _token = payload.get('access_token')
+    _expires_at = time.monotonic() + float(payload.get('expires_in', 3600))
+    return _token
+
+def _refresh():
+    # Single flight: every caller that needs a new token awaits the same request
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_fetch_token())
+        _refresh_task.add_done_callback(_log_refresh_failure)
+    return _refresh_task
+
+async def get_azure_auth_token():
+    """Bot Framework access token, cached until shortly before it expires.
+
+    Inside the AZURE_TOKEN_REFRESH_AHEAD window the cached token is still
+    returned while a background refresh replaces it, so replies never wait
+    on login.microsoftonline.com unless the token has actually run out.
+    """
+    remaining = _expires_at - time.monotonic()
+    if _token and remaining > AZURE_TOKEN_REFRESH_AHEAD:
+        return _token
+    if _token and remaining > MIN_TOKEN_LIFETIME:
+        _refresh()
+        return _token
+    return await asyncio.shield(_refresh())
+
+def _log_refresh_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Azure token refresh failed: {task.exception()}")
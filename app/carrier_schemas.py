@@ -0,0 +1,119 @@
+# app/carrier_schemas.py
+import csv
+import re
+from typing import Dict, List, Optional, Tuple
+
+# How far into a file we look for the header row (Verizon prepends a report title line)
+HEADER_SAMPLE_LINES = 10
+HEADER_SAMPLE_BYTES = 64 * 1024
+
+class CarrierSchema:
+    """How to recognise and normalize one carrier's CSV export.
+
+    ``signature`` lists header columns that must all be present for a file to
+    be detected as this schema. ``columns`` renames source columns to the
+    normalized names, and ``transforms`` are (column, regex, replacement)
+    rewrites, compiled once and applied to whole columns.
+    """
+
+    def __init__(self, name, carrier, signature, columns, transforms=()):
+        self.name = name
+        self.carrier = carrier
+        self.signature = frozenset(signature)
+        self.columns = dict(columns)
+        self.transforms = [(column, re.compile(pattern), replacement) for column, pattern, replacement in transforms]
+
+    def apply_transforms(self, df):
+        for column, pattern, replacement in self.transforms:
+            if column in df.columns:
+                df[column] = df[column].str.replace(pattern, replacement, regex=True)
+        return df
+
+    def fingerprint(self):
+        # Stable description for cache keys; changes whenever the schema does
+        return {
+            "carrier": self.carrier,
+            "signature": sorted(self.signature),
+            "columns": self.columns,
+            "transforms": [(column, pattern.pattern, replacement) for column, pattern, replacement in self.transforms],
+        }
+
+    def __repr__(self):
+        return f"CarrierSchema({self.name!r}, carrier={self.carrier!r})"
+
+CARRIER_SCHEMAS: Dict[str, CarrierSchema] = {}
+
+def register_schema(schema: CarrierSchema):
+    CARRIER_SCHEMAS[schema.name] = schema
+    return schema
+
+register_schema(CarrierSchema(
+    "verizon", "Verizon",
+    signature=("Mobile Number", "Username", "Device ID", "SIM ID"),
+    columns={
+        "Device ID": "IMEI",
+        "SIM ID": "SIM",
+        "Mobile Number": "Phone Number",
+        "Username": "Device Name",
+        "Cost Center": "cost_center"
+    },
+))
+
+register_schema(CarrierSchema(
+    "tmobile", "T-Mobile",
+    signature=("Mobile Number", "Device User", "DAC"),
+    columns={
+        "DAC": "cost_center",
+        "Device User": "Device Name",
+        "Mobile Number": "Phone Number"
+    },
+    # T-Mobile prefixes identifiers with "IMEI:" and "SIM:"
+    transforms=(("IMEI", r"^IMEI:", ""), ("SIM", r"^SIM:", "")),
+))
+
+register_schema(CarrierSchema(
+    "att_phones", "AT&T",
+    signature=("Wireless number", "Wireless user name", "Device IMEI"),
+    columns={
+        "Device IMEI": "IMEI",
+        "SIM number (ICCID)": "SIM",
+        "Wireless number": "Phone Number",
+        "COST CENTER": "cost_center",
+        "Wireless user name": "Device Name"
+    },
+))
+
+register_schema(CarrierSchema(
+    "att_devices", "AT&T",
+    signature=("ICCID", "MSISDN", "IMEI"),
+    columns={
+        "IMEI": "IMEI",
+        "ICCID": "SIM",
+        "MSISDN": "Phone Number",
+        "Customer": "cost_center",
+        "Device ID": "Device Name",
+        "IMEI Model": "model.name"
+    },
+))
+
+def _sample_rows(path) -> List[List[str]]:
+    with open(path, "rb") as f:
+        sample = f.read(HEADER_SAMPLE_BYTES).decode("utf-8-sig", errors="replace")
+    lines = sample.splitlines()[:HEADER_SAMPLE_LINES]
+    return [[cell.strip() for cell in row] for row in csv.reader(lines)]
+
+def detect_schema(path) -> Optional[Tuple[CarrierSchema, int]]:
+    """Find the schema whose signature matches a header row near the top of ``path``.
+
+    Returns (schema, header row offset), or None when no schema's signature is
+    fully present. The most specific match (largest signature) wins.
+    """
+    best = None
+    for offset, row in enumerate(_sample_rows(path)):
+        header = set(row)
+        for schema in CARRIER_SCHEMAS.values():
+            if schema.signature <= header and (best is None or len(schema.signature) > len(best[0].signature)):
+                best = (schema, offset)
+        if best is not None:
+            return best
+    return None
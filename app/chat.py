@@ -1,11 +1,20 @@
 # app/chat.py
 from fastapi import Request, HTTPException
-import httpx
-from typing import Tuple
+from fastapi.responses import JSONResponse
 import logging
-from .openai_integration import query_openai
+import time
+from contextlib import aclosing
+from .openai_integration import (query_openai, stream_openai, context_token_budget, count_message_tokens,
+                                 OPENAI_ERROR_PREFIX)
+from .answer_cache import answer_cache
+from .sessions import session_store, is_follow_up, names_own_subject
 from .azure_auth import get_azure_auth_token
-from .config import DEBUG
+from .http_client import get_http_client
+from .query_engine import answer_query
+from .worker import activity_queue
+from .metrics import Counter, span, current_trace_id
+from .config import (DEBUG, RETRIEVAL_TOP_K, OPENAI_STREAMING, STREAM_UPDATE_SECONDS,
+                     SESSION_FOLLOW_UP_TOKEN_BUDGET)
 
 # Set up logging based on DEBUG flag
 if DEBUG:
@@ -18,124 +27,224 @@ else:
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.WARNING)
 
-def process_user_query(user_message: str) -> Tuple[str, int]:
-    # Example implementation: Extract category and limit from the user's query
-    category = None
-    limit = None
-
-    if "smartphone" in user_message.lower():
-        category = "Smartphone"
-    if "first" in user_message.lower() and "assets" in user_message.lower():
-        limit = 5
-
-    return category, limit
-
-def map_fieldsets_to_models(models, fieldsets):
-    fieldset_map = {fieldset["id"]: fieldset["fields"] for fieldset in fieldsets}
-    model_fieldset_map = {model["id"]: fieldset_map.get(model["fieldset_id"], []) for model in models}
-    return model_fieldset_map
-
-def summarize_data(data, model_fieldset_map, category=None, limit=None):
-    if category:
-        data = [item for item in data if item.get('category', {}).get('name') == category]
-    if limit:
-        data = data[:limit]
-    summary = "\n".join([
-        f"ID: {item.get('id', 'N/A')}, Name: {item.get('name', 'N/A')}, Tag: {item.get('asset_tag', 'N/A')}, "
-        f"Model: {item.get('model', {}).get('name', 'N/A')}, Category: {item.get('category', {}).get('name', 'N/A')}, "
-        f"Status: {item.get('status_label', {}).get('name', 'N/A')}, Assigned To: {item.get('assigned_to', {}).get('name', 'N/A')}, "
-        f"Location: {item.get('location', {}).get('name', 'N/A')}, Last Checkout: {item.get('last_checkout', {}).get('formatted', 'N/A')}, "
-        f"Custom Fields: {', '.join([f'{k}: {v.get('value', 'N/A')}' for k, v in item.get('custom_fields', {}).items() if k in model_fieldset_map.get(item.get('model', {}).get('id'), [])])}"
-        for item in data
-    ])
-    return summary
-
-async def process_chat(request: Request, carrier_data, snipeit_data, snipeit_categories, snipeit_fieldsets, snipeit_models):
-    body = await request.json()
-
-    if body.get("type") != "message":
-        return {}
-
-    user_message = body.get("text", "")
-    service_url = body["serviceUrl"]
-    conversation_id = body["conversation"]["id"]
-    reply_to_id = body["id"]
-    bot_id = body["recipient"]["id"]
-    sender_id = body["from"]["id"]
-
-    # Create asset summary with all assets, not limited
-    asset_summary = "\n".join([
-        f"• Name: {a.get('name', 'N/A')}, Tag: {a.get('asset_tag', 'N/A')}, "
-        f"Status: {a.get('status', 'N/A')}, Model: {a.get('model', 'N/A')}, "
-        f"Category: {a.get('category', 'N/A')}, "
-        f"Assigned To: {a.get('assigned_to', 'N/A')}, "
-        f"Location: {a.get('location', 'N/A')}, "
-        f"Serial: {a.get('serial', 'N/A')}"
-        for a in snipeit_data  # No limit on number of assets
-    ])
-    
-    # Include all carrier data
-    carrier_summary = "\n".join([
-        f"• Device: {c.get('Device Name', 'N/A')}, IMEI: {c.get('IMEI', 'N/A')}, "
-        f"SIM: {c.get('SIM', 'N/A')}, Phone Number: {c.get('Phone Number', 'N/A')}, "
-        f"Carrier: {c.get('Carrier', 'N/A')}, Cost Center: {c.get('cost_center', 'N/A')}"
-        for c in carrier_data  # No limit
-    ])
-    
-    # Include all categories
-    categories_summary = "\n".join([
-        f"• Category: {c.get('name', 'N/A')}, Type: {c.get('category_type', 'N/A')}, "
-        f"Asset Count: {c.get('assets_count', 'N/A')}, Item Count: {c.get('item_count', 'N/A')}"
-        for c in snipeit_categories  # No limit
-    ])
-
-    # Log information only if DEBUG is True
-    if DEBUG:
-        logger.info(f"Total assets in snipeit_data: {len(snipeit_data)}")
-        
-        # Check for specific asset tag
-        asset_427 = next((a for a in snipeit_data if a.get('asset_tag') == '00427'), None)
-        if asset_427:
-            logger.info(f"Found asset 00427: {asset_427}")
-        else:
-            logger.info("Asset tag 00427 not found in the dataset")
-        
-        # Display the first 10 asset tags for debugging
-        first_10_tags = [a.get('asset_tag') for a in snipeit_data[:10]]
-        logger.info(f"First 10 asset tags: {first_10_tags}")
+WARMING_UP_MESSAGE = "I'm still warming up and loading the inventory data. Please try again in a minute."
 
-    logger = logging.getLogger(__name__)
-    
-    # Search for asset tag 00427 in the data passed to the function
-    asset_427 = next((asset for asset in snipeit_data if asset.get("asset_tag") == "00427"), None)
-    if asset_427:
-        logger.warning(f"Found asset 00427 in process_chat: {asset_427}")
-    else:
-        logger.warning(f"Asset tag 00427 NOT FOUND in process_chat")
-        # Log the first 5 asset tags to see what's available
-        first_5_tags = [asset.get("asset_tag") for asset in snipeit_data[:5]]
-        logger.warning(f"First 5 asset tags in process_chat: {first_5_tags}")
+# Fresh matches retrieved for a follow-up, on top of the rows its conversation already surfaced
+FOLLOW_UP_TOP_K = max(1, RETRIEVAL_TOP_K // 4)
 
-    # Query OpenAI with all required arguments
-    bot_response = query_openai(asset_summary, carrier_summary, categories_summary, user_message)
+answers_total = Counter("assetbot_answers_total", "Messages answered, by how the answer was produced", ["path"])
 
+async def _bot_headers():
     # Get Azure Bot token
     token = await get_azure_auth_token()
     if not token:
         raise HTTPException(status_code=500, detail="Azure token authentication failed.")
-
-    azure_headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    azure_response = {
-        "type": "message",
-        "from": {"id": bot_id},
-        "recipient": {"id": sender_id},
-        "conversation": {"id": conversation_id},
-        "text": bot_response,
-        "replyToId": reply_to_id,
+    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+def _reply_activity(body, text=None, activity_type="message"):
+    activity = {
+        "type": activity_type,
+        "from": {"id": body["recipient"]["id"]},
+        "recipient": {"id": body["from"]["id"]},
+        "conversation": {"id": body["conversation"]["id"]},
+        "replyToId": body["id"],
     }
+    if text is not None:
+        activity["text"] = text
+    return activity
+
+def _activities_url(body, activity_id):
+    return f"{body['serviceUrl']}/v3/conversations/{body['conversation']['id']}/activities/{activity_id}"
+
+async def send_reply(body, text):
+    """Post ``text`` as a reply to ``body``; returns the new activity's id (needed to update it)."""
+    headers = await _bot_headers()
+    with span("reply_post"):
+        response = await get_http_client().post(_activities_url(body, body["id"]), headers=headers,
+                                                json=_reply_activity(body, text))
+    try:
+        return response.json().get("id")
+    except ValueError:
+        return None
+
+async def update_reply(body, activity_id, text):
+    """Replace the text of a reply we posted earlier."""
+    activity = {**_reply_activity(body, text), "id": activity_id}
+    headers = await _bot_headers()
+    with span("reply_update"):
+        await get_http_client().put(_activities_url(body, activity_id), headers=headers, json=activity)
+
+async def send_typing(body):
+    headers = await _bot_headers()
+    with span("typing_post"):
+        await get_http_client().post(_activities_url(body, body["id"]), headers=headers,
+                                     json=_reply_activity(body, activity_type="typing"))
+
+REQUIRED_ACTIVITY_FIELDS = (("id",), ("serviceUrl",), ("conversation", "id"), ("recipient", "id"), ("from", "id"))
+
+def validate_activity(body):
+    for path in REQUIRED_ACTIVITY_FIELDS:
+        value = body
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if not value:
+            raise HTTPException(status_code=400, detail=f"Activity is missing {'.'.join(path)}")
+
+async def process_chat(request: Request):
+    # Acknowledge straight away; a worker builds and posts the reply
+    with span("body_parse"):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Activity body is not valid JSON")
+
+    if not isinstance(body, dict) or body.get("type") != "message":
+        return {}
+
+    validate_activity(body)
+    status = activity_queue.enqueue(body)
+    if status == "full":
+        return JSONResponse(status_code=503, content={"status": "busy"}, headers={"Retry-After": "5"})
+    return {"status": status}
 
-    async with httpx.AsyncClient() as http_client:
-        await http_client.post(f"{service_url}/v3/conversations/{conversation_id}/activities/{reply_to_id}",
-                               headers=azure_headers, json=azure_response)
+async def handle_activity(body, snapshot):
+    # Data is still loading in the background; answer without touching OpenAI
+    if snapshot is None:
+        answers_total.inc(path="warming_up")
+        await send_reply(body, WARMING_UP_MESSAGE)
+        return
 
-    return {}
+    user_message = body.get("text", "")
+    conversation_id = body["conversation"]["id"]
+    session = session_store.get(conversation_id)
+    rows = None
+
+    # "Is it deployed?" leans on earlier turns: answer it with the conversation so far and the
+    # rows it already surfaced, not a search of the whole inventory. A follow-up that names its
+    # own subject ("which of those are at City Hall?") still gets the conversation, but its rows
+    # come from a normal search. Never cached, since the same words mean something else in
+    # another conversation.
+    if session is not None and session.has_context() and is_follow_up(user_message):
+        session_store.counters["follow_ups"] += 1
+        answers_total.inc(path="follow_up")
+        history = session.history()
+        budget = context_token_budget(user_message) - count_message_tokens(history)
+        if names_own_subject(user_message, snapshot.assets.counts("category"), snapshot.assets.counts("location")):
+            rows = retrieve_rows(user_message, snapshot)
+        else:
+            rows = retrieve_rows(user_message, snapshot, session)
+            budget = min(SESSION_FOLLOW_UP_TOKEN_BUDGET, budget)
+        budget = max(0, budget)
+        bot_response = await llm_answer(body, user_message, snapshot, rows, budget, history)
+        if not OPENAI_STREAMING:
+            await send_reply(body, bot_response)
+    else:
+        # Structured questions (lookups, counts, lists) are answered straight from the data
+        with span("fast_path"):
+            bot_response = answer_query(user_message, snapshot)
+        if bot_response is not None:
+            answers_total.inc(path="fast_path")
+            await send_reply(body, bot_response)
+        else:
+            bot_response, rows = await cached_llm_answer(body, user_message, snapshot)
+
+    # Remember the turn for follow-ups; the reply is already out, so this adds no latency
+    if not bot_response.startswith(OPENAI_ERROR_PREFIX):
+        if rows is None:
+            rows = retrieve_rows(user_message, snapshot)
+        session_store.record(conversation_id, user_message, bot_response, *rows)
+
+async def cached_llm_answer(body, user_message, snapshot):
+    """Answer from the cache or OpenAI, posted to Teams; returns the answer and the rows
+    retrieved for it (None on a cache hit)."""
+    streamed = computed = False
+    rows = None
+
+    async def compute():
+        nonlocal streamed, computed, rows
+        computed = True
+        answers_total.inc(path="llm")
+        rows = retrieve_rows(user_message, snapshot)
+        streamed = OPENAI_STREAMING
+        return await llm_answer(body, user_message, snapshot, rows, context_token_budget(user_message))
+
+    # Repeat questions against the same data come from the cache, skipping retrieval and OpenAI
+    bot_response = await answer_cache.get_or_compute(
+        user_message, snapshot.version, compute,
+        cacheable=lambda answer: not answer.startswith(OPENAI_ERROR_PREFIX))
+
+    # A streamed answer is already in Teams; cache hits and coalesced answers still need posting
+    if not streamed:
+        if not computed:
+            answers_total.inc(path="cache")
+        await send_reply(body, bot_response)
+    return bot_response, rows
+
+async def llm_answer(body, user_message, snapshot, rows, budget, history=None):
+    """Answer with OpenAI from ``rows``. With OPENAI_STREAMING the answer is streamed into
+    Teams as it is generated; otherwise the caller posts it."""
+    sections = prompt_sections(snapshot, *rows, budget)
+    if OPENAI_STREAMING:
+        return await stream_answer(body, user_message, sections, history)
+    return await query_openai(*sections, user_message, history=history)
+
+async def stream_answer(body, user_message, sections, history=None):
+    """Show a typing indicator, post the first words as soon as they arrive, then keep
+    updating that reply at most every STREAM_UPDATE_SECONDS until the answer is complete.
+
+    Returns the full answer, or an OPENAI_ERROR_PREFIX message (so it isn't cached)
+    if the completion failed part way.
+    """
+    await send_typing(body)
+    text, shown, activity_id, last_update, error = "", None, None, 0.0, None
+    try:
+        # Closed even if posting to Teams fails, so the OpenAI permit isn't held until GC
+        async with aclosing(stream_openai(*sections, user_message, history=history)) as deltas:
+            async for delta in deltas:
+                text += delta
+                if not text.strip():
+                    continue
+                now = time.monotonic()
+                if shown is None:
+                    activity_id, shown, last_update = await send_reply(body, text), text, now
+                elif activity_id and now - last_update >= STREAM_UPDATE_SECONDS:
+                    await update_reply(body, activity_id, text)
+                    shown, last_update = text, now
+    except Exception as e:
+        error = f"{OPENAI_ERROR_PREFIX}{str(e)}"
+        logger.error(error)
+        text = f"{text}\n\n{error}" if text.strip() else error
+
+    if shown is None:
+        await send_reply(body, text)
+    elif text != shown:
+        # Channels that don't return an activity id can't be updated; post the full answer instead
+        await (update_reply(body, activity_id, text) if activity_id else send_reply(body, text))
+    return error or text
+
+def retrieve_rows(user_message, snapshot, session=None):
+    """Assets and carrier lines for ``user_message``, most relevant first.
+
+    For a follow-up, the rows the conversation already surfaced come first
+    (assets are looked up again, so they carry the current values), then a
+    few fresh matches for the new question.
+    """
+    with span("retrieval"):
+        if session is None:
+            return snapshot.retriever.search(user_message, RETRIEVAL_TOP_K)
+        assets, lines = snapshot.retriever.search(user_message, FOLLOW_UP_TOP_K)
+        remembered = filter(None, map(snapshot.assets.by_id, session.asset_ids))
+        assets = list({asset.id: asset for asset in [*remembered, *assets]}.values())
+        lines = list({id(line): line for line in [*session.lines, *lines]}.values())
+        return assets, lines
+
+def prompt_sections(snapshot, assets, lines, budget):
+    """The asset, carrier and category tables for the retrieved rows, trimmed to ``budget`` tokens."""
+    # Rows were rendered when the snapshot was built; this only picks as many as the token budget allows
+    with span("context_build"):
+        asset_summary, carrier_summary, categories_summary, _ = snapshot.prompt_context.fit(assets, lines, budget)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"trace={current_trace_id()} prompt rows: {len(assets)} assets, {len(lines)} carrier lines")
+
+    return asset_summary, carrier_summary, categories_summary
@@ -7,11 +7,81 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-SNIPE_IT_API_URL = "https://mukilteowa.snipe-it.io/api/v1"
+SNIPE_IT_API_URL = os.getenv("SNIPE_IT_API_URL", "https://mukilteowa.snipe-it.io/api/v1")
 SNIPE_IT_API_KEY = os.getenv("SNIPE_IT_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 AZURE_BOT_APP_ID = os.getenv("AZURE_BOT_APP_ID")
 AZURE_BOT_APP_PASSWORD = os.getenv("AZURE_BOT_APP_PASSWORD")
+AZURE_AUTH_URL = os.getenv("AZURE_AUTH_URL", "https://login.microsoftonline.com/botframework.com/oauth2/v2.0/token")
+
+# Snipe-IT paging: page size per request, parallel requests in flight, retries on 429/5xx
+SNIPE_IT_PAGE_SIZE = int(os.getenv("SNIPE_IT_PAGE_SIZE", "500"))
+SNIPE_IT_MAX_CONCURRENCY = int(os.getenv("SNIPE_IT_MAX_CONCURRENCY", "8"))
+SNIPE_IT_MAX_RETRIES = int(os.getenv("SNIPE_IT_MAX_RETRIES", "5"))
+SNIPE_IT_TIMEOUT = float(os.getenv("SNIPE_IT_TIMEOUT", "30"))
+
+# Seconds to wait before retrying a failed background warm-up
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "30"))
+
+# Background inventory refresh: seconds between incremental syncs (0 disables),
+# and how many syncs between full reloads
+INVENTORY_REFRESH_SECONDS = float(os.getenv("INVENTORY_REFRESH_SECONDS", "300"))
+INVENTORY_FULL_REFRESH_EVERY = int(os.getenv("INVENTORY_FULL_REFRESH_EVERY", "12"))
+
+# How many assets / carrier lines retrieval puts in each OpenAI prompt
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "40"))
+
+# OpenAI: model, per-request timeout (seconds), completions in flight per worker, retries
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+# Token budget for the whole prompt (instructions, data tables, question) and cap on the reply
+OPENAI_PROMPT_TOKEN_BUDGET = int(os.getenv("OPENAI_PROMPT_TOKEN_BUDGET", "6000"))
+OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "1000"))
+# Stream answers into Teams as they are generated, updating the reply at most every N seconds
+OPENAI_STREAMING = os.getenv("OPENAI_STREAMING", "True").lower() == "true"
+STREAM_UPDATE_SECONDS = float(os.getenv("STREAM_UPDATE_SECONDS", "1.0"))
+
+# Shared outbound HTTP client: connection pool size and default timeout (seconds)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+# Refresh the Bot Framework token this many seconds before it expires
+AZURE_TOKEN_REFRESH_AHEAD = float(os.getenv("AZURE_TOKEN_REFRESH_AHEAD", "300"))
+
+# /chat worker pool: concurrent workers, queued activities before /chat returns 503,
+# and how many recent activity ids are remembered for de-duplication
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "8"))
+CHAT_QUEUE_SIZE = int(os.getenv("CHAT_QUEUE_SIZE", "1000"))
+CHAT_DEDUP_WINDOW = int(os.getenv("CHAT_DEDUP_WINDOW", "10000"))
+
+# Carrier CSVs larger than this are ingested in chunks of CARRIER_CHUNK_ROWS rows
+CARRIER_STREAM_THRESHOLD_MB = float(os.getenv("CARRIER_STREAM_THRESHOLD_MB", "50"))
+CARRIER_CHUNK_ROWS = int(os.getenv("CARRIER_CHUNK_ROWS", "50000"))
+
+# Snapshot store shared by uvicorn workers ("" disables it): SQLite path, how often
+# followers check for a new version (seconds), how many versions to keep, and how long
+# the leader's lease lasts without renewal before another worker takes over (seconds)
+SNAPSHOT_DB = os.getenv("SNAPSHOT_DB", str(Path(__file__).parent.parent / "cache" / "inventory.sqlite3"))
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "5"))
+SNAPSHOT_KEEP_VERSIONS = int(os.getenv("SNAPSHOT_KEEP_VERSIONS", "3"))
+SNAPSHOT_LEASE_SECONDS = float(os.getenv("SNAPSHOT_LEASE_SECONDS", "60"))
+
+# Cache of LLM answers per snapshot version: max entries, seconds an answer lives, max bytes held
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Conversation sessions for follow-up questions: conversations kept, idle seconds before one is
+# dropped, bytes held across all of them, turns kept verbatim before older ones are compacted,
+# rows remembered per conversation, and the token budget for a follow-up's data tables
+SESSION_MAX_CONVERSATIONS = int(os.getenv("SESSION_MAX_CONVERSATIONS", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(8 * 1024 * 1024)))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "4"))
+SESSION_MAX_ROWS = int(os.getenv("SESSION_MAX_ROWS", "20"))
+SESSION_FOLLOW_UP_TOKEN_BUDGET = int(os.getenv("SESSION_FOLLOW_UP_TOKEN_BUDGET", "1500"))
 
 # Read debug setting from .env
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
@@ -0,0 +1,170 @@
+# app/export.py
+import csv
+import io
+import json
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from .asset_store import ASSET_FIELDS, MULTI_INDEXES, UNIQUE_INDEXES, AssetStore
+from .reconcile import ASSET_SUMMARY_FIELDS, Reconciliation
+
+# Media type per export format
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Rows encoded per chunk sent; small enough that the first bytes go out at once
+EXPORT_BATCH_ROWS = 500
+
+# Query parameters that control the export; every other parameter is a filter
+EXPORT_OPTIONS = ("format", "fields", "limit")
+
+class ExportError(ValueError):
+    """A field or filter the export doesn't know about."""
+
+def _filter_key(value) -> str:
+    return " ".join(str(value).split()).casefold() if value is not None else ""
+
+def _matches(row: Dict, filters: Dict[str, set]) -> bool:
+    # A field matches if it equals any of the values given for it (case-insensitive)
+    return all(_filter_key(row.get(field)) in wanted for field, wanted in filters.items())
+
+def _check_fields(names: Iterable[str], available: Sequence[str], what: str):
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ExportError(f"Unknown {what}: {', '.join(unknown)}. Available: {', '.join(available)}")
+
+def _prepare(fields: Optional[List[str]], filters: Dict[str, List[str]], available: Sequence[str],
+             default: Optional[Sequence[str]] = None):
+    """Validated output columns and filters (field -> set of normalized values)."""
+    fields = list(fields) if fields else list(default or available)
+    _check_fields(fields, available, "fields")
+    _check_fields(filters, available, "filters")
+    return fields, {field: {_filter_key(value) for value in values} for field, values in filters.items()}
+
+class Export:
+    """Rows for one export, produced lazily, and the columns they carry."""
+
+    def __init__(self, fields: List[str], rows: Iterator[Dict]):
+        self.fields = fields
+        self.rows = rows
+
+def export_assets(store: AssetStore, fields=None, filters=None, limit=None) -> Export:
+    """Assets with one column per field and per custom field label.
+
+    The nested ``custom_fields`` dict is only included when asked for by name.
+
+    A filter on an indexed field (status, location, category, ...) only visits
+    the matching assets; the rest are checked row by row.
+    """
+    labels = [label for label in store.custom_field_labels() if label not in ASSET_FIELDS]
+    available = list(ASSET_FIELDS) + labels
+    default = [field for field in available if field != "custom_fields"]
+    fields, filters = _prepare(fields, filters or {}, available, default)
+
+    def rows():
+        records, remaining = store, dict(filters)
+        indexed = [field for field in remaining if field in UNIQUE_INDEXES or field in MULTI_INDEXES]
+        if indexed and len(remaining[indexed[0]]) == 1:
+            field = indexed[0]
+            records = store.find(field, next(iter(remaining.pop(field))))
+        custom_needed = any(field in labels for field in fields) or any(field in labels for field in remaining)
+        for record in records:
+            row = {field: getattr(record, field) for field in ASSET_FIELDS}
+            if custom_needed:
+                custom = row["custom_fields"]
+                row.update((label, custom.get(label)) for label in labels)
+            if _matches(row, remaining):
+                yield {field: row.get(field) for field in fields}
+
+    return Export(fields, islice(rows(), limit))
+
+def export_carrier(carrier_data: List[Dict], fields=None, filters=None, limit=None) -> Export:
+    """Normalized carrier lines, with the columns the ingest produced."""
+    available = list(carrier_data[0]) if carrier_data else []
+    fields, filters = _prepare(fields, filters or {}, available)
+    rows = ({field: line.get(field) for field in fields} for line in carrier_data if _matches(line, filters))
+    return Export(fields, islice(rows, limit))
+
+# Reconciled rows are flat: the section, how the match was made, then the asset's
+# summary fields and the carrier line's columns under "asset." / "carrier." prefixes
+RECONCILED_FIELDS = ("section", "match") + tuple(f"asset.{field}" for field in ASSET_SUMMARY_FIELDS)
+
+def _reconciled_row(section: str, method, asset, line, line_fields) -> Dict:
+    row = {"section": section, "match": method}
+    for field in ASSET_SUMMARY_FIELDS:
+        row[f"asset.{field}"] = getattr(asset, field) if asset is not None else None
+    for field in line_fields:
+        row[f"carrier.{field}"] = line.get(field) if line is not None else None
+    return row
+
+def export_reconciled(reconciliation: Reconciliation, carrier_data: List[Dict], fields=None, filters=None,
+                      limit=None) -> Export:
+    """Matched pairs, orphan carrier lines and unbilled devices, one row each."""
+    line_fields = list(carrier_data[0]) if carrier_data else []
+    available = list(RECONCILED_FIELDS) + [f"carrier.{field}" for field in line_fields]
+    fields, filters = _prepare(fields, filters or {}, available)
+
+    def rows():
+        for line, asset, method in reconciliation.matched:
+            yield _reconciled_row("matched", method, asset, line, line_fields)
+        for line in reconciliation.orphan_lines:
+            yield _reconciled_row("orphan_lines", None, None, line, line_fields)
+        for asset in reconciliation.unbilled_devices:
+            yield _reconciled_row("unbilled_devices", None, asset, None, line_fields)
+
+    selected = ({field: row[field] for field in fields} for row in rows() if _matches(row, filters))
+    return Export(fields, islice(selected, limit))
+
+def _batches(rows: Iterator[Dict]) -> Iterator[List[Dict]]:
+    while True:
+        batch = list(islice(rows, EXPORT_BATCH_ROWS))
+        if not batch:
+            return
+        yield batch
+
+def encode_ndjson(export: Export) -> Iterator[bytes]:
+    for batch in _batches(export.rows):
+        yield "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in batch).encode("utf-8")
+
+def _csv_cell(value):
+    # Nested values (custom_fields) go into one cell as JSON
+    return json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list)) else value
+
+def encode_csv(export: Export) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export.fields)
+    for batch in _batches(export.rows):
+        writer.writerows([_csv_cell(row[field]) for field in export.fields] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")  # header only: nothing matched
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv}
+
+def parse_export_params(params: Iterable[Tuple[str, str]]):
+    """(format, fields, limit, filters) from query parameters.
+
+    ``fields`` is comma-separated; any other parameter filters on the field it
+    names, and repeating it matches any of the values.
+    """
+    options, filters = {}, {}
+    for key, value in params:
+        if key in EXPORT_OPTIONS:
+            options[key] = value
+        else:
+            filters.setdefault(key, []).append(value)
+
+    export_format = options.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    fields = [field.strip() for field in options["fields"].split(",") if field.strip()] if "fields" in options else None
+    limit = None
+    if "limit" in options:
+        try:
+            limit = int(options["limit"])
+        except ValueError:
+            raise ExportError("limit must be an integer") from None
+        if limit < 0:
+            raise ExportError("limit must not be negative")
+    return export_format, fields, limit, filters
@@ -0,0 +1,33 @@
+# app/http_client.py
+import importlib.util
+import logging
+import httpx
+from .config import HTTP_MAX_CONNECTIONS, HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+
+# One pooled client for Snipe-IT, Azure auth and Bot Framework replies, so
+# connections (and their TLS handshakes) are reused across requests
+_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+        )
+        if not HTTP2_ENABLED:
+            logger.info("h2 not installed, shared HTTP client is using HTTP/1.1")
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
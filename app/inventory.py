@@ -0,0 +1,236 @@
+# app/inventory.py
+import asyncio
+import itertools
+import logging
+import time
+from .asset_store import AssetStore, fields_by_model
+from .reconcile import build_reconciliation
+from .retrieval import RetrievalIndex
+from .prompt_context import PromptContext
+from .normalize_carrier import CarrierLine, normalize_carrier_data
+from .snipeit_api import (get_snipeit_assets, get_snipeit_assets_updated_since, get_snipeit_categories,
+                          get_snipeit_fieldsets, get_snipeit_models)
+from .snapshot_store import snapshot_store
+from .metrics import timed, span
+from .config import (WARMUP_RETRY_SECONDS, INVENTORY_REFRESH_SECONDS, INVENTORY_FULL_REFRESH_EVERY,
+                     SNAPSHOT_POLL_SECONDS, SNAPSHOT_LEASE_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+_versions = itertools.count(1)
+
+class InventorySnapshot:
+    """All the data the bot answers from, loaded together.
+
+    Snapshots are never mutated after they are built; a refresh builds a new one
+    and swaps it in, so a request that grabbed a snapshot keeps a consistent view.
+    """
+
+    def __init__(self, carrier_data, assets, categories, fieldsets, models, version=None, loaded_at=None,
+                 previous=None):
+        self.carrier_data = carrier_data
+        # Custom fields are projected onto each model's fieldset once, here, rather than per request
+        self.assets = assets if isinstance(assets, AssetStore) else AssetStore(assets, fields_by_model(models, fieldsets))
+        self.categories = categories
+        self.fieldsets = fieldsets
+        self.models = models
+        # Carrier lines joined to assets, precomputed so /reconcile never has to
+        self.reconciliation = build_reconciliation(carrier_data, self.assets)
+        self.retriever = RetrievalIndex(self.assets, carrier_data, self.reconciliation)
+        # Prompt rows rendered up front; a refresh re-renders only the rows that changed
+        self.prompt_context = PromptContext(self.assets, carrier_data, categories,
+                                            previous.prompt_context if previous is not None else None)
+        # Replaced by the store's version number once saved, so every worker agrees on it
+        self.version = version if version is not None else next(_versions)
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        # Newest Snipe-IT updated_at we have seen; the next incremental sync starts here
+        self.synced_until = self.assets.synced_until
+
+# None until the first load finishes
+_snapshot = None
+
+def get_snapshot():
+    return _snapshot
+
+def is_ready():
+    return _snapshot is not None
+
+def _swap(snapshot):
+    global _snapshot
+    _snapshot = snapshot  # a single reference assignment, so readers never see a half-built snapshot
+
+async def _publish(snapshot):
+    """Swap ``snapshot`` in, saving it first so the other workers and the next restart get it."""
+    if snapshot is _snapshot:
+        return  # a refresh that found nothing new; keep the version (and the answer cache) as is
+    if snapshot_store is not None:
+        try:
+            snapshot.version = await asyncio.to_thread(snapshot_store.save, snapshot)
+        except Exception as e:
+            logger.error(f"Could not save inventory snapshot: {e}")
+    _swap(snapshot)
+
+def _read_stored_snapshot(version=None):
+    data = snapshot_store.load(version)
+    if data is None:
+        return None
+    carrier_data = [CarrierLine.from_dict(line) for line in data["carrier_data"]]
+    return InventorySnapshot(carrier_data, data["assets"], data["categories"], data["fieldsets"],
+                             data["models"], version=data["version"], loaded_at=data["created_at"])
+
+async def load_stored_snapshot(version=None):
+    """The latest (or given) snapshot from the store, or None if there isn't one."""
+    if snapshot_store is None:
+        return None
+    try:
+        return await asyncio.to_thread(_read_stored_snapshot, version)
+    except Exception as e:
+        logger.error(f"Could not load stored inventory snapshot: {e}")
+        return None
+
+async def load_inventory():
+    # CSV parsing is blocking, so run it in a thread alongside the Snipe-IT calls
+    started = time.perf_counter()
+    carrier_data, assets, categories, fieldsets, models = await asyncio.gather(
+        timed("load_carrier", asyncio.to_thread(normalize_carrier_data)),
+        timed("load_assets", get_snipeit_assets()),
+        timed("load_categories", get_snipeit_categories()),
+        timed("load_fieldsets", get_snipeit_fieldsets()),
+        timed("load_models", get_snipeit_models()),
+    )
+    logger.warning(f"Inventory loaded in {time.perf_counter() - started:.2f}s: "
+                   f"{len(assets)} assets, {len(carrier_data)} carrier lines")
+    # Building the indexes is CPU-bound; keep it off the event loop so /chat still acknowledges
+    with span("build_snapshot"):
+        return await asyncio.to_thread(InventorySnapshot, carrier_data, assets, categories, fieldsets, models)
+
+async def refresh_inventory(snapshot):
+    """Build a new snapshot from ``snapshot`` plus whatever changed in Snipe-IT since it was synced.
+
+    Returns ``snapshot`` itself when nothing changed, which _publish skips.
+    """
+    started = time.perf_counter()
+    changed_assets, categories, fieldsets, models = await asyncio.gather(
+        timed("load_assets_changed", get_snipeit_assets_updated_since(snapshot.synced_until)),
+        timed("load_categories", get_snipeit_categories()),
+        timed("load_fieldsets", get_snipeit_fieldsets()),
+        timed("load_models", get_snipeit_models()),
+    )
+    # Rows stamped in the watermark's second are always re-fetched; drop the ones we already hold
+    changed_assets = [asset for asset in changed_assets if not snapshot.assets.is_current(asset)]
+    if not changed_assets and (categories, fieldsets, models) == (snapshot.categories, snapshot.fieldsets,
+                                                                   snapshot.models):
+        logger.info(f"Inventory unchanged after {time.perf_counter() - started:.2f}s")
+        return snapshot
+
+    assets = snapshot.assets.merged(changed_assets, fields_by_model(models, fieldsets))
+    logger.info(f"Inventory refreshed in {time.perf_counter() - started:.2f}s: "
+                f"{len(changed_assets)} changed assets")
+    with span("build_snapshot"):
+        return await asyncio.to_thread(InventorySnapshot, snapshot.carrier_data, assets, categories, fieldsets,
+                                       models, previous=snapshot)
+
+async def warm_up():
+    """Load the inventory in the background, retrying until it succeeds.
+
+    With the snapshot store enabled the last saved snapshot is served straight
+    away. Only the leader then goes to Snipe-IT (a cheap incremental sync);
+    the other workers wait for keep_fresh to pick up what the leader saves.
+    """
+    if snapshot_store is not None:
+        is_leader = snapshot_store.try_become_leader()
+        stored = await load_stored_snapshot()
+        if stored is not None:
+            logger.warning(f"Serving stored inventory snapshot v{stored.version}: {len(stored.assets)} assets")
+            _swap(stored)
+        if not is_leader:
+            return
+        if stored is not None:
+            try:
+                await _publish(await refresh_inventory(stored))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Refresh of stored inventory snapshot failed: {e}")
+    while _snapshot is None:
+        try:
+            await _publish(await load_inventory())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Inventory warm-up failed, retrying in {WARMUP_RETRY_SECONDS}s: {e}")
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+async def _follow():
+    """Followers: swap in newer versions saved by the leader, and take over if it goes away."""
+    while not await asyncio.to_thread(snapshot_store.try_become_leader):
+        await asyncio.sleep(SNAPSHOT_POLL_SECONDS)
+        try:
+            latest = await asyncio.to_thread(snapshot_store.latest_version)
+        except Exception as e:
+            logger.error(f"Could not check snapshot store: {e}")
+            continue
+        if latest is not None and (_snapshot is None or latest > _snapshot.version):
+            stored = await load_stored_snapshot(latest)
+            if stored is not None:
+                _swap(stored)
+    logger.warning("Took over inventory refresh from the previous leader")
+    if _snapshot is None:
+        await warm_up()
+
+async def _hold_lease():
+    # Renewed well before it runs out, and independently of refreshes, which can take a while
+    while True:
+        await asyncio.sleep(SNAPSHOT_LEASE_SECONDS / 3)
+        if not snapshot_store.is_leader:
+            continue
+        try:
+            if not await asyncio.to_thread(snapshot_store.try_become_leader):
+                logger.warning("Lost the inventory refresh lease to another worker")
+        except Exception as e:
+            logger.error(f"Could not renew the inventory refresh lease: {e}")
+
+async def keep_fresh():
+    """Refresh the snapshot every INVENTORY_REFRESH_SECONDS.
+
+    Most cycles only pull assets changed since the last sync. Every
+    INVENTORY_FULL_REFRESH_EVERY cycles a full reload picks up deleted assets
+    and new carrier CSVs, which an updated_at sync cannot see. With the
+    snapshot store, only the worker holding its lease refreshes; the others
+    follow, and take over if the lease lapses.
+    """
+    if snapshot_store is None:
+        await _refresh()
+        return
+    lease = asyncio.create_task(_hold_lease())
+    try:
+        await _refresh()
+    finally:
+        lease.cancel()
+        snapshot_store.release_leadership()
+
+async def _refresh():
+    for cycle in itertools.count(1):
+        if snapshot_store is not None and not snapshot_store.is_leader:
+            await _follow()
+        if INVENTORY_REFRESH_SECONDS <= 0:
+            if snapshot_store is None:
+                return
+            await asyncio.sleep(SNAPSHOT_POLL_SECONDS)  # nothing to refresh, but keep the lease
+            continue
+        await asyncio.sleep(INVENTORY_REFRESH_SECONDS)
+        if snapshot_store is not None and not snapshot_store.is_leader:
+            continue  # the lease went to another worker while we waited
+        snapshot = _snapshot
+        if snapshot is None:
+            continue  # warm_up is still on it
+        try:
+            if INVENTORY_FULL_REFRESH_EVERY and cycle % INVENTORY_FULL_REFRESH_EVERY == 0:
+                await _publish(await load_inventory())
+            else:
+                await _publish(await refresh_inventory(snapshot))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Keep serving the old snapshot; the next cycle will try again
+            logger.error(f"Inventory refresh failed: {e}")
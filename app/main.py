@@ -1,18 +1,147 @@
 # app/main.py
-from fastapi import FastAPI, Request
-from .chat import process_chat
-from .normalize_carrier import normalize_carrier_data
-from .snipeit_api import get_snipeit_assets, get_snipeit_categories, get_snipeit_fieldsets, get_snipeit_models
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from .chat import process_chat, handle_activity
+from .inventory import get_snapshot, warm_up, keep_fresh
+from .http_client import close_http_client
+from .normalize_carrier import last_ingest_stats
+from .worker import activity_queue
+from .answer_cache import answer_cache
+from .sessions import session_store
+from .export import (ENCODERS, EXPORT_FORMATS, ExportError, export_assets, export_carrier, export_reconciled,
+                     parse_export_params)
+from .metrics import (CallbackMetric, Histogram, render_metrics, new_trace_id, set_trace_id,
+                      current_trace_id)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load carrier + Snipe-IT data in the background so uvicorn can bind straight away
+    # and keep it fresh afterwards
+    tasks = [asyncio.create_task(warm_up()), asyncio.create_task(keep_fresh())]
+    # Replies are built by a worker pool; the snapshot is read when the activity is handled
+    activity_queue.start(lambda body: handle_activity(body, get_snapshot()))
+    yield
+    await activity_queue.stop()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    await close_http_client()
 
-# Load and store carrier data + Snipe-IT data at startup
-carrier_data = normalize_carrier_data(debug=True)
-snipeit_data = get_snipeit_assets(debug=True)
-snipeit_categories = get_snipeit_categories(debug=True)
-snipeit_fieldsets = get_snipeit_fieldsets(debug=True)
-snipeit_models = get_snipeit_models(debug=True)
+app = FastAPI(lifespan=lifespan)
+
+http_request_seconds = Histogram("assetbot_http_request_seconds", "Time to answer an HTTP request", ["path", "status"])
+CallbackMetric("assetbot_queue_events_total", "Activity queue events", "counter",
+               lambda: {name: value for name, value in activity_queue.counters.items()}, ["event"])
+CallbackMetric("assetbot_queue_depth", "Activities waiting for a worker", "gauge",
+               lambda: activity_queue.stats()["depth"])
+CallbackMetric("assetbot_answer_cache_events_total", "Answer cache hits, misses, evictions and invalidations",
+               "counter", lambda: dict(answer_cache.counters), ["event"])
+CallbackMetric("assetbot_answer_cache_entries", "Answers currently cached", "gauge",
+               lambda: answer_cache.stats()["entries"])
+CallbackMetric("assetbot_session_events_total", "Conversation session follow-ups, compactions, evictions and expirations",
+               "counter", lambda: dict(session_store.counters), ["event"])
+CallbackMetric("assetbot_sessions", "Conversations with a live session", "gauge",
+               lambda: session_store.stats()["conversations"])
+CallbackMetric("assetbot_session_bytes", "Approximate bytes held by conversation sessions", "gauge",
+               lambda: session_store.bytes)
+CallbackMetric("assetbot_snapshot_version", "Version of the inventory snapshot being served", "gauge",
+               lambda: get_snapshot().version if get_snapshot() else None)
+CallbackMetric("assetbot_snapshot_assets", "Assets in the inventory snapshot being served", "gauge",
+               lambda: len(get_snapshot().assets) if get_snapshot() else None)
+
+TRACE_HEADER = "X-Request-ID"
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Reuse the caller's request id if it sent one, so our logs line up with theirs
+    set_trace_id(request.headers.get(TRACE_HEADER) or new_trace_id())
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, so stray URLs can't blow up the series count
+    route = request.scope.get("route")
+    http_request_seconds.observe(time.perf_counter() - started, path=route.path if route else "unmatched",
+                                 status=response.status_code)
+    response.headers[TRACE_HEADER] = current_trace_id()
+    return response
 
 @app.post("/chat")
 async def chat_with_assets(request: Request):
-    return await process_chat(request, carrier_data, snipeit_data, snipeit_categories, snipeit_fieldsets, snipeit_models)
+    return await process_chat(request)
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return JSONResponse(status_code=503, content={"status": "warming up", "queue": activity_queue.stats()})
+    return {
+        "status": "ready",
+        "queue": activity_queue.stats(),
+        "answer_cache": answer_cache.stats(),
+        "sessions": session_store.stats(),
+        "assets": len(snapshot.assets),
+        "carrier_lines": len(snapshot.carrier_data),
+        "version": snapshot.version,
+        "carrier_files": last_ingest_stats,
+        "loaded_at": snapshot.loaded_at
+    }
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+RECONCILE_SECTIONS = ("matched", "orphan_lines", "unbilled_devices")
+
+@app.get("/reconcile")
+async def reconcile(section: Optional[str] = None, limit: int = 100):
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return JSONResponse(status_code=503, content={"status": "warming up"})
+    if section is not None and section not in RECONCILE_SECTIONS:
+        raise HTTPException(status_code=400, detail=f"section must be one of {', '.join(RECONCILE_SECTIONS)}")
+
+    reconciliation = snapshot.reconciliation
+    sections = [section] if section else RECONCILE_SECTIONS
+    response = {"version": snapshot.version, "summary": reconciliation.summary()}
+    for name in sections:
+        response[name] = reconciliation.rows(name, limit)
+    return response
+
+def _stream_export(request: Request, name: str, build):
+    """Stream ``build(snapshot, fields, filters, limit)`` as NDJSON or CSV, a batch of rows at a time."""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return JSONResponse(status_code=503, content={"status": "warming up"})
+    try:
+        export_format, fields, limit, filters = parse_export_params(request.query_params.multi_items())
+        export = build(snapshot, fields, filters, limit)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Rows are read from the snapshot taken here, so a refresh mid-export can't mix versions
+    filename = f"{name}-v{snapshot.version}.{export_format}" if snapshot.version else f"{name}.{export_format}"
+    return StreamingResponse(ENCODERS[export_format](export), media_type=EXPORT_FORMATS[export_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/export/assets")
+async def export_assets_endpoint(request: Request):
+    return _stream_export(request, "assets",
+                          lambda snapshot, *args: export_assets(snapshot.assets, *args))
+
+@app.get("/export/carrier")
+async def export_carrier_endpoint(request: Request):
+    return _stream_export(request, "carrier",
+                          lambda snapshot, *args: export_carrier(snapshot.carrier_data, *args))
+
+@app.get("/export/reconciled")
+async def export_reconciled_endpoint(request: Request):
+    return _stream_export(request, "reconciled",
+                          lambda snapshot, *args: export_reconciled(snapshot.reconciliation, snapshot.carrier_data, *args))
@@ -1,94 +1,360 @@
 # app/normalize_carrier.py
 import pandas as pd
+import hashlib
+import importlib.util
 import json
 import os
-import tempfile
-
-DATA_DIR = tempfile.gettempdir()
-os.makedirs(DATA_DIR, exist_ok=True)
-
-carrier_files = {
-    "verizon.csv": "Verizon",
-    "tmobile.csv": "T-Mobile",
-    "att_phones.csv": "AT&T",
-    "att_devices.csv": "AT&T"
-}
-
-column_mappings = {
-    "verizon.csv": {
-        "Device ID": "IMEI",
-        "SIM ID": "SIM",
-        "Mobile Number": "Phone Number",
-        "Username": "Device Name",
-        "Cost Center": "cost_center"
-    },
-    "tmobile.csv": {
-        "DAC": "cost_center",
-        "Device User": "Device Name",
-        "Mobile Number": "Phone Number"
-    },
-    "att_phones.csv": {
-        "Device IMEI": "IMEI",
-        "SIM number (ICCID)": "SIM",
-        "Wireless number": "Phone Number",
-        "COST CENTER": "cost_center",
-        "Wireless user name": "Device Name"
-    },
-    "att_devices.csv": {
-        "IMEI": "IMEI",
-        "ICCID": "SIM",
-        "MSISDN": "Phone Number",
-        "Customer": "cost_center",
-        "Device ID": "Device Name",
-        "IMEI Model": "model.name"
-    }
-}
+import pickle
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .carrier_schemas import CARRIER_SCHEMAS, detect_schema
+from .config import CARRIER_CHUNK_ROWS, CARRIER_STREAM_THRESHOLD_MB
 
 required_columns = ["IMEI", "SIM", "Phone Number", "Device Name", "Carrier", "cost_center"]
 
-def normalize_carrier_data(debug=False):
-    cleaned_data = []
+# Carrier CSVs live here; the normalized result is cached under CACHE_DIR
+SOURCE_DIR = "data"
+CACHE_DIR = Path(__file__).parent.parent / "cache"
+
+# Parquet via pyarrow (in requirements.txt), read back memory-mapped; pickled DataFrames only if it's missing
+CACHE_FORMAT = "parquet" if importlib.util.find_spec("pyarrow") is not None else "pickle"
+
+# Source CSVs are hashed this many bytes at a time
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# Per-file stats from the most recent ingest (empty when it came from the cache)
+last_ingest_stats = []
+
+# Columns whose few distinct values (and the "UNKNOWN" placeholder anywhere) are shared by every line
+SHARED_VALUE_COLUMNS = ("Carrier", "cost_center")
+PLACEHOLDER = "UNKNOWN"
+
+_LINE_SLOTS = {"IMEI": "imei", "SIM": "sim", "Phone Number": "phone_number", "Device Name": "device_name",
+               "Carrier": "carrier", "cost_center": "cost_center"}
+
+class CarrierLine(Mapping):
+    """One normalized carrier line, read like a dict keyed by ``required_columns``.
 
-    for file, carrier in carrier_files.items():
+    Lines are most of a snapshot, so each is a slotted object rather than a dict.
+    """
+    __slots__ = tuple(_LINE_SLOTS.values())
+
+    def __init__(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+    @classmethod
+    def from_dict(cls, line):
+        return cls(*(line.get(column) for column in required_columns))
+
+    def __getitem__(self, column):
         try:
-            df = pd.read_csv(f"data/{file}", sep=",", dtype=str, skiprows=1 if "verizon" in file else 0)
-            print(f"✅ Loaded {file}")
-        except Exception as e:
-            print(f"❌ Error loading {file}: {e}")
+            return getattr(self, _LINE_SLOTS[column])
+        except KeyError:
+            raise KeyError(column) from None
+
+    def __iter__(self):
+        return iter(required_columns)
+
+    def __len__(self):
+        return len(required_columns)
+
+    def __repr__(self):
+        return f"CarrierLine({dict(self)!r})"
+
+def _fold_lines(frames):
+    """CarrierLines from normalized frames, taken one frame at a time."""
+    lines = []
+    shared = {column: {} for column in SHARED_VALUE_COLUMNS}
+    columns = [shared.get(column) for column in required_columns]
+    for df in frames:
+        for values in df[required_columns].itertuples(index=False, name=None):
+            lines.append(CarrierLine(*(
+                PLACEHOLDER if value == PLACEHOLDER else value if seen is None else seen.setdefault(value, value)
+                for value, seen in zip(values, columns))))
+    return lines
+
+class CarrierSource:
+    """A CSV in SOURCE_DIR together with the schema detected for it."""
+
+    def __init__(self, path, schema, header_row):
+        self.path = path
+        self.name = path.name
+        self.schema = schema
+        self.header_row = header_row
+
+    def read_options(self):
+        return dict(sep=",", dtype=str, skiprows=self.header_row, encoding="utf-8-sig")
+
+def discover_sources():
+    """Every CSV dropped into SOURCE_DIR whose header matches a registered carrier schema."""
+    sources = []
+    for path in sorted(Path(SOURCE_DIR).glob("*.csv")):
+        try:
+            detected = detect_schema(path)
+        except OSError as e:
+            print(f"❌ Error reading {path.name}: {e}")
+            continue
+        if detected is None:
+            # Better to skip a file than fill every column with "UNKNOWN"
+            print(f"❌ Skipping {path.name}: header doesn't match any carrier schema")
             continue
+        sources.append(CarrierSource(path, *detected))
+    return sources
+
+def _normalize_frame(df, schema):
+    df.columns = df.columns.str.strip()
+    df = df.rename(columns=schema.columns)
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    # Ensure all required columns exist
+    df = df.reindex(columns=required_columns, fill_value="UNKNOWN")
+    df["Carrier"] = schema.carrier
+    return _clean(schema.apply_transforms(df))
+
+def _file_stats(source, rows, seconds, streamed):
+    size = source.path.stat().st_size
+    stats = {
+        "file": source.name,
+        "schema": source.schema.name,
+        "carrier": source.schema.carrier,
+        "header_row": source.header_row,
+        "rows": rows,
+        "bytes": size,
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(rows / seconds) if seconds else None,
+        "mb_per_second": round(size / 1024 / 1024 / seconds, 2) if seconds else None,
+        "streamed": streamed,
+    }
+    print(f"✅ Loaded {source.name} as {source.schema.name}: {rows} rows in {seconds:.3f}s"
+          f" ({stats['rows_per_second']} rows/s)")
+    return stats
+
+def _load_carrier_file(source):
+    started = time.perf_counter()
+    df = _normalize_frame(pd.read_csv(source.path, **source.read_options()), source.schema)
+    return df, _file_stats(source, len(df), time.perf_counter() - started, streamed=False)
+
+def _iter_carrier_file_chunks(source, chunk_rows):
+    # Only one chunk of raw rows is held at a time, however large the export is
+    with pd.read_csv(source.path, chunksize=chunk_rows, **source.read_options()) as reader:
+        for chunk in reader:
+            yield _normalize_frame(chunk, source.schema)
+
+def _clean(df):
+    # One vectorized pass per column: drop tabs, trim, and clean phone numbers (remove dots, spaces)
+    df = df.fillna("UNKNOWN")
+    for col in required_columns:
+        df[col] = df[col].str.replace("\t", "", regex=False).str.strip()
+    df["Phone Number"] = df["Phone Number"].str.replace(r"[.\s]", "", regex=True)
+    return df.reset_index(drop=True)
 
-        df.columns = df.columns.str.strip()
-        if file in column_mappings:
-            df = df.rename(columns=column_mappings[file])
-        df = df.loc[:, ~df.columns.duplicated()].copy()
-        df["Carrier"] = carrier
-
-        # Clean phone numbers (remove dots, spaces)
-        if "Phone Number" in df.columns:
-            df["Phone Number"] = df["Phone Number"].str.replace(r"[.\s]", "", regex=True)
-
-        # Remove "IMEI:" and "SIM:" prefixes for T-Mobile
-        if carrier == "T-Mobile":
-            if "IMEI" in df.columns:
-                df["IMEI"] = df["IMEI"].str.replace("IMEI:", "", regex=False)
-            if "SIM" in df.columns:
-                df["SIM"] = df["SIM"].str.replace("SIM:", "", regex=False)
-
-        # Ensure all required columns exist
-        for col in required_columns:
-            if col not in df.columns:
-                df[col] = "UNKNOWN"
-
-        df = df[required_columns]
-        df = df.apply(lambda x: x.str.replace("\t", "").str.strip() if x.dtype == "object" else x)
-        df = df.reset_index(drop=True)
-        cleaned_data.extend(df.to_dict(orient="records"))
-
-    # Write to JSON for debugging
-    if debug:
-        with open(f"{DATA_DIR}/carrier_data.json", "w") as json_file:
-            json.dump(cleaned_data, json_file, indent=4)
-        print(f"✔ Debug JSON saved to {DATA_DIR}/carrier_data.json")
-
-    return cleaned_data  # Store in-memory instead of always saving
+def _file_sha256(path):
+    # Read in blocks so a large export never has to fit in memory
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_BYTES):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _source_fingerprint():
+    """Cache key over every CSV in SOURCE_DIR (name, size, mtime, content hash) and the schema registry.
+
+    Hashes from the last run are reused when size and mtime are unchanged,
+    so a warm start doesn't even read the CSVs.
+    """
+    manifest_path = CACHE_DIR / "carrier_manifest.json"
+    try:
+        previous = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        previous = {}
+
+    files = {}
+    for path in sorted(Path(SOURCE_DIR).glob("*.csv")):
+        file = path.name
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entry = previous.get("files", {}).get(file, {})
+        if entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                     "sha256": _file_sha256(path)}
+        files[file] = entry
+
+    key = hashlib.sha256(json.dumps(
+        {"files": {f: e["sha256"] for f, e in files.items()},
+         "schemas": {name: schema.fingerprint() for name, schema in CARRIER_SCHEMAS.items()}},
+        sort_keys=True).encode()).hexdigest()[:16]
+    return key, {"key": key, "files": files}, manifest_path
+
+def _cache_path(key):
+    return CACHE_DIR / f"carrier_data.{key}.{CACHE_FORMAT}"
+
+class _CacheWriter:
+    """Writes normalized chunks to the cache file as they arrive.
+
+    Chunks go to a temp file that is renamed into place on ``commit``, so
+    another worker never reads a half-written cache.
+    """
+
+    def __init__(self, path, manifest, manifest_path):
+        CACHE_DIR.mkdir(exist_ok=True)
+        self.path = path
+        self.manifest = manifest
+        self.manifest_path = manifest_path
+        self.tmp_path = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+        self._file = None
+        self._parquet_writer = None
+
+    def write(self, df):
+        if CACHE_FORMAT == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.tmp_path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            if self._file is None:
+                self._file = open(self.tmp_path, "wb")
+            pickle.dump(df, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def commit(self):
+        if self._parquet_writer is None and self._file is None:
+            self.write(pd.DataFrame(columns=required_columns))
+        self._close()
+        os.replace(self.tmp_path, self.path)
+        self.manifest_path.write_text(json.dumps(self.manifest))
+        # Caches for older keys only; another worker's .tmp may still be being written
+        for old in CACHE_DIR.glob("carrier_data.*"):
+            if old != self.path and old.suffix in (".parquet", ".pickle"):
+                old.unlink(missing_ok=True)
+
+    def abort(self):
+        self._close()
+        self.tmp_path.unlink(missing_ok=True)
+
+def _iter_cache(path, chunk_rows):
+    if CACHE_FORMAT == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        with open(path, "rb") as cache_file:
+            while True:
+                try:
+                    yield pickle.load(cache_file)
+                except EOFError:
+                    return
+
+def _read_cache(path):
+    frames = list(_iter_cache(path, CARRIER_CHUNK_ROWS))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=required_columns)
+
+def load_carrier_frame(use_cache=True):
+    """All carrier lines as one normalized DataFrame, from cache when the CSVs are unchanged."""
+    key, manifest, manifest_path = _source_fingerprint()
+    path = _cache_path(key)
+    if use_cache and path.exists():
+        try:
+            df = _read_cache(path)
+            last_ingest_stats.clear()
+            print(f"✅ Loaded carrier data from cache {path.name}")
+            return df
+        except Exception as e:
+            print(f"❌ Error reading carrier cache {path.name}: {e}")
+
+    # Parse every detected CSV in one parallel batch; pandas' C parser releases the GIL for most of the work
+    frames, stats = [], []
+    sources = discover_sources()
+    with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as pool:
+        futures = {source.name: pool.submit(_load_carrier_file, source) for source in sources}
+        for file, future in futures.items():
+            try:
+                df, file_stats = future.result()
+                frames.append(df)
+                stats.append(file_stats)
+            except Exception as e:
+                print(f"❌ Error loading {file}: {e}")
+    last_ingest_stats[:] = stats
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=required_columns)
+    if use_cache:
+        writer = _CacheWriter(path, manifest, manifest_path)
+        try:
+            writer.write(df)
+            writer.commit()
+        except OSError as e:
+            writer.abort()
+            print(f"❌ Error writing carrier cache: {e}")
+    return df
+
+def iter_carrier_chunks(use_cache=True, chunk_rows=None):
+    """Normalized carrier lines as DataFrames of at most ``chunk_rows`` rows.
+
+    Files are read one chunk at a time and each chunk is appended to the cache
+    as soon as it is cleaned, so peak memory follows the chunk size rather than
+    the size of the export. An up-to-date cache is streamed back the same way.
+    """
+    chunk_rows = chunk_rows or CARRIER_CHUNK_ROWS
+    key, manifest, manifest_path = _source_fingerprint()
+    path = _cache_path(key)
+    if use_cache and path.exists():
+        print(f"✅ Streaming carrier data from cache {path.name}")
+        last_ingest_stats.clear()
+        yield from _iter_cache(path, chunk_rows)
+        return
+
+    writer = _CacheWriter(path, manifest, manifest_path) if use_cache else None
+    committed = False
+    last_ingest_stats.clear()
+    try:
+        for source in discover_sources():
+            rows = 0
+            started = time.perf_counter()
+            try:
+                for chunk in _iter_carrier_file_chunks(source, chunk_rows):
+                    rows += len(chunk)
+                    if writer is not None:
+                        writer.write(chunk)
+                    yield chunk
+                last_ingest_stats.append(_file_stats(source, rows, time.perf_counter() - started, streamed=True))
+            except (OSError, ValueError, pd.errors.ParserError) as e:
+                print(f"❌ Error loading {source.name}: {e}")
+        if writer is not None:
+            try:
+                writer.commit()
+                committed = True
+            except OSError as e:
+                # The lines were all yielded; without a cache the next load just parses the CSVs again
+                print(f"❌ Error writing carrier cache: {e}")
+    finally:
+        if writer is not None and not committed:
+            writer.abort()
+
+def _should_stream():
+    # Stream when any export is big enough that loading it whole would spike memory
+    threshold = CARRIER_STREAM_THRESHOLD_MB * 1024 * 1024
+    for path in Path(SOURCE_DIR).glob("*.csv"):
+        try:
+            if path.stat().st_size > threshold:
+                return True
+        except OSError:
+            pass
+    return False
 
+def normalize_carrier_data(use_cache=True, stream=None):
+    if stream is None:
+        stream = _should_stream()
+    # Chunks are folded into lines as they are read, so only one chunk is ever held as a DataFrame
+    frames = iter_carrier_chunks(use_cache) if stream else [load_carrier_frame(use_cache)]
+    return _fold_lines(frames)  # Store in-memory instead of always saving
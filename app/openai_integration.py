@@ -1,10 +1,39 @@
 # app/openai_integration.py
+import asyncio
+import random
+import time
+from contextlib import aclosing
+from functools import lru_cache
 import openai
 import logging
-from .config import OPENAI_API_KEY, DEBUG
+from .tokens import count_tokens
+from .metrics import Counter, Histogram, current_trace_id, span
+from .config import (OPENAI_API_KEY, DEBUG, OPENAI_MODEL, OPENAI_TIMEOUT, OPENAI_MAX_CONCURRENCY,
+                     OPENAI_MAX_RETRIES, OPENAI_MAX_TOKENS, OPENAI_PROMPT_TOKEN_BUDGET)
 
-# Initialize OpenAI client
-openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Initialize OpenAI client; retries are handled below so they can share the concurrency cap
+openai_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=0)
+
+# Caps completions in flight per worker so a burst of messages can't trip the rate limit
+openai_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+
+# query_openai returns errors as reply text starting with this, so they can be told apart from answers
+OPENAI_ERROR_PREFIX = "OpenAI Error: "
+
+openai_tokens_total = Counter("assetbot_openai_tokens_total",
+                              "Tokens used by completions; prompt_estimated is our own count before sending", ["kind"])
+openai_requests_total = Counter("assetbot_openai_requests_total", "Completions requested, by outcome", ["outcome"])
+openai_prompt_cache_ratio = Histogram("assetbot_openai_prompt_cache_ratio",
+                                      "Share of each request's prompt tokens served from the provider's prefix cache",
+                                      buckets=(0.0, 0.25, 0.5, 0.75, 0.9, 1.0))
+openai_first_token_seconds = Histogram("assetbot_openai_first_token_seconds",
+                                       "Time from requesting a streamed completion to its first content")
+openai_request_tokens = Histogram("assetbot_openai_request_tokens", "Tokens used by each completion", ["kind"],
+                                  buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000))
 
 # Set up logging based on DEBUG flag
 if DEBUG:
@@ -15,54 +44,164 @@ else:
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.WARNING)
 
-def query_openai(snipeit_summary, carrier_summary, categories_summary, user_message):
-    logger = logging.getLogger(__name__)
-    
-    # Check if the summary contains the asset tag we're looking for
-    if "00427" in snipeit_summary:
-        logger.warning(f"Asset tag 00427 IS included in the OpenAI prompt")
-    else:
-        logger.warning(f"Asset tag 00427 is NOT included in the OpenAI prompt")
-    
-    # Log the lengths of the summaries if DEBUG is True
-    if DEBUG:
-        logger.info(f"snipeit_summary length: {len(snipeit_summary)}")
-        logger.info(f"carrier_summary length: {len(carrier_summary)}")
-        logger.info(f"categories_summary length: {len(categories_summary)}")
-    
-    prompt = f"""
-    You are an IT asset assistant. You have access to the following data:
-
-    Snipe-IT Data (Assets):
-    {snipeit_summary}
-
-    Mobile Carrier Data:
-    {carrier_summary}
-
-    Snipe-IT Categories:
-    {categories_summary}
-
-    The data is structured as follows:
-    - Snipe-IT Data: Information about IT assets including name, tag, status, model, category, assigned to, location, and serial
-    - Mobile Carrier Data: Information about mobile devices including device name, IMEI, SIM, phone number, carrier, and cost center
-    - Snipe-IT Categories: Categories of assets including name, type, asset count, and item count
-
-    Please answer the user's questions based on the data provided. Be flexible with spelling errors in the user's questions.
-    If the information is partially available but not complete, provide what you can find rather than saying it's not available.
-    Look for similar or related information if exact matches aren't found.
-
-    User's Question: {user_message}
+# One INFO line per completion with its trace id, so a request's token use can be looked up
+usage_logger = logging.getLogger(f"{__name__}.usage")
+usage_logger.setLevel(logging.INFO)
+
+def _retry_delay(error, attempt):
+    # Prefer the server's Retry-After, else full-jitter exponential backoff
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** attempt)))
+
+async def _holding_permit(stream):
+    # A streamed completion is still in flight until its last chunk is read
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        try:
+            await stream.close()
+        finally:
+            openai_semaphore.release()
+
+async def create_completion(**kwargs):
+    """chat.completions.create with the concurrency cap and retries on rate limits / transient errors.
+
+    With ``stream=True`` the permit is held until the returned stream is read to
+    the end or closed, so close it (``contextlib.aclosing``) if you stop early.
     """
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        try:
+            await openai_semaphore.acquire()
+            try:
+                response = await openai_client.chat.completions.create(**kwargs)
+            except BaseException:
+                openai_semaphore.release()
+                raise
+            if kwargs.get("stream"):
+                return _holding_permit(response)
+            openai_semaphore.release()
+            return response
+        except RETRYABLE_ERRORS as e:
+            if attempt == OPENAI_MAX_RETRIES:
+                raise
+            openai_requests_total.inc(outcome="retry")
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"OpenAI {type(e).__name__}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+# The provider caches prompts by prefix, so the parts that rarely change come first and must be
+# byte-identical between calls: the fixed instructions, then the category table (the same for every
+# question against one snapshot). Only the conversation so far (for follow-ups), the rows picked for
+# this question and the question follow.
+SYSTEM_PROMPT = """You are an IT asset assistant. You have access to IT asset data in the following tables:
+- Snipe-IT Categories: asset categories (name, type, asset count, item count)
+- Snipe-IT Data: IT assets (name, tag, status, model, category, assigned to, location, serial)
+- Mobile Carrier Data: mobile lines (device name, IMEI, SIM, phone number, carrier, cost center)
+
+Each table's first line names the columns, each following line is one row with its values separated
+by "|". Empty values are unknown.
+
+Counts in Snipe-IT Categories cover the whole inventory; the asset and carrier rows are only the records
+most relevant to the user's question.
+Please answer the user's questions based on the data provided. Be flexible with spelling errors in the user's questions.
+If the information is partially available but not complete, provide what you can find rather than saying it's not available.
+Look for similar or related information if exact matches aren't found."""
+
+# Chat formatting adds a few tokens per message, plus a few to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_OVERHEAD_TOKENS = 3
+
+def build_messages(snipeit_summary, carrier_summary, categories_summary, user_message, history=None):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": f"Snipe-IT Categories:\n{categories_summary}"},
+        *(history or ()),
+        {"role": "user", "content": f"Snipe-IT Data (Assets):\n{snipeit_summary}\n\n"
+                                    f"Mobile Carrier Data:\n{carrier_summary}"},
+        {"role": "user", "content": f"User's Question: {user_message}"},
+    ]
+
+def count_message_tokens(messages):
+    return REPLY_OVERHEAD_TOKENS + sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+@lru_cache(maxsize=1)
+def _prompt_overhead_tokens():
+    return count_message_tokens(build_messages("", "", "", ""))
+
+def context_token_budget(user_message):
+    """Tokens left for the data tables once the instructions and the question are in."""
+    return max(0, OPENAI_PROMPT_TOKEN_BUDGET - _prompt_overhead_tokens() - count_tokens(user_message))
+
+def _record_usage(usage, estimated_tokens):
+    prompt_tokens = usage.prompt_tokens if usage else estimated_tokens
+    completion_tokens = usage.completion_tokens if usage else 0
+    openai_requests_total.inc(outcome="ok")
+    openai_tokens_total.inc(prompt_tokens, kind="prompt")
+    openai_tokens_total.inc(completion_tokens, kind="completion")
+    openai_tokens_total.inc(estimated_tokens, kind="prompt_estimated")
+    # Prompt tokens the provider served from its prefix cache (absent on models without one)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    openai_tokens_total.inc(cached_tokens, kind="prompt_cached")
+    if prompt_tokens:
+        openai_prompt_cache_ratio.observe(cached_tokens / prompt_tokens)
+    openai_request_tokens.observe(prompt_tokens, kind="prompt")
+    openai_request_tokens.observe(completion_tokens, kind="completion")
+    usage_logger.info(f"trace={current_trace_id()} prompt_tokens={prompt_tokens} cached_tokens={cached_tokens} "
+                      f"completion_tokens={completion_tokens} estimated_prompt_tokens={estimated_tokens}")
+
+async def stream_openai(snipeit_summary, carrier_summary, categories_summary, user_message, history=None):
+    """Yield the answer as it is generated. Errors are raised, not returned as text."""
+    messages = build_messages(snipeit_summary, carrier_summary, categories_summary, user_message, history)
+    estimated_tokens = count_message_tokens(messages)
+    started = time.perf_counter()
+    first_token = False
+    try:
+        with span("openai"):
+            stream = await create_completion(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_tokens=OPENAI_MAX_TOKENS,
+                stream=True,
+                stream_options={"include_usage": True},  # usage arrives on the last chunk
+            )
+            usage = None
+            async with aclosing(stream):
+                async for chunk in stream:
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if not first_token:
+                            first_token = True
+                            openai_first_token_seconds.observe(time.perf_counter() - started)
+                        yield chunk.choices[0].delta.content
+    except Exception:
+        openai_requests_total.inc(outcome="error")
+        raise
+    _record_usage(usage, estimated_tokens)
+
+async def query_openai(snipeit_summary, carrier_summary, categories_summary, user_message, history=None):
+    messages = build_messages(snipeit_summary, carrier_summary, categories_summary, user_message, history)
+    estimated_tokens = count_message_tokens(messages)
 
-    # Use a much larger context window for GPT-4 Turbo
     try:
-        openai_response = openai_client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=4000  # Increase max tokens for response
-        )
+        with span("openai"):
+            openai_response = await create_completion(
+                model=OPENAI_MODEL,
+                messages=messages,
+                max_tokens=OPENAI_MAX_TOKENS
+            )
+        _record_usage(openai_response.usage, estimated_tokens)
         return openai_response.choices[0].message.content
     except Exception as e:
+        openai_requests_total.inc(outcome="error")
         if DEBUG:
             logger.error(f"OpenAI Error: {str(e)}")
-        return f"OpenAI Error: {str(e)}"
+        return f"{OPENAI_ERROR_PREFIX}{str(e)}"
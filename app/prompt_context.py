@@ -0,0 +1,150 @@
+# app/prompt_context.py
+from typing import Dict, List, Tuple
+from .asset_store import AssetStore
+from .tokens import count_tokens
+
+# Rows go into the prompt as pipe-separated tables: one header line per section, then
+# bare values, which costs roughly half the tokens of "Name: ..., Tag: ..." lines
+ASSET_COLUMNS = (("name", "name"), ("tag", "asset_tag"), ("status", "status"), ("model", "model"),
+                 ("category", "category"), ("assigned_to", "assigned_to"), ("location", "location"),
+                 ("serial", "serial"))
+LINE_COLUMNS = (("device", "Device Name"), ("imei", "IMEI"), ("sim", "SIM"), ("phone", "Phone Number"),
+                ("carrier", "Carrier"), ("cost_center", "cost_center"))
+CATEGORY_COLUMNS = (("category", "name"), ("type", "category_type"), ("assets", "assets_count"),
+                    ("items", "item_count"))
+
+ASSET_HEADER = "|".join(name for name, _ in ASSET_COLUMNS)
+LINE_HEADER = "|".join(name for name, _ in LINE_COLUMNS)
+CATEGORY_HEADER = "|".join(name for name, _ in CATEGORY_COLUMNS)
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    return " ".join(str(value).replace("|", "/").split())
+
+def _render(row, columns) -> str:
+    return "|".join(_cell(row.get(field)) for _, field in columns)
+
+def render_asset(a) -> str:
+    return _render(a, ASSET_COLUMNS)
+
+def render_line(c) -> str:
+    return _render(c, LINE_COLUMNS)
+
+def render_category(c) -> str:
+    return _render(c, CATEGORY_COLUMNS)
+
+# Rows are joined with "\n", which is (nearly always) a token of its own
+SEPARATOR_TOKENS = 1
+
+def _fit_sections(sections: List[List[Tuple[str, int]]], budget: int) -> List[int]:
+    """How many leading rows of each section fit in ``budget`` tokens.
+
+    Each section is offered an equal share; whatever a short section leaves
+    over is shared out again among the others, so no budget is wasted.
+    """
+    kept = [0] * len(sections)
+    used = [0] * len(sections)
+    active = [i for i, rows in enumerate(sections) if rows]
+    while active:
+        remaining = budget - sum(used)
+        share = remaining // len(active)
+        if share <= 0:
+            break
+        progressed = False
+        for i in list(active):
+            rows, limit = sections[i], used[i] + share
+            while kept[i] < len(rows) and used[i] + rows[kept[i]][1] + SEPARATOR_TOKENS <= limit:
+                used[i] += rows[kept[i]][1] + SEPARATOR_TOKENS
+                kept[i] += 1
+                progressed = True
+            if kept[i] == len(rows):
+                active.remove(i)
+        if not progressed:
+            break
+    return kept
+
+def _header_tokens(header: str) -> int:
+    return count_tokens(header) + SEPARATOR_TOKENS
+
+def _table(header: str, rows) -> Tuple[str, int]:
+    """A header line plus ``rows`` (``(text, tokens, ...)`` tuples), and its token count."""
+    block = "\n".join([header] + [row[0] for row in rows])
+    return block, _header_tokens(header) + sum(row[1] + SEPARATOR_TOKENS for row in rows)
+
+class PromptContext:
+    """Prompt rows for one inventory snapshot, rendered once with their token counts.
+
+    Every asset and carrier line is rendered when the snapshot is built, so a
+    request only joins the strings for the rows retrieval picked. Built from
+    the previous snapshot's context, it reuses the rendered rows for every
+    record that did not change and renders only the rest.
+    """
+
+    def __init__(self, store: AssetStore, carrier_data, categories, previous: "PromptContext" = None):
+        # asset id -> (values, text, tokens). The row is reused while the values it shows are
+        # unchanged; updated_at alone isn't enough, since renaming a model, category or
+        # location doesn't bump it on the assets that use them
+        self.asset_rows: Dict[int, Tuple[tuple, str, int]] = {}
+        reused = previous.asset_rows if previous is not None else {}
+        self.rendered_assets = 0
+        for record in store:
+            values = tuple(record.get(field) for _, field in ASSET_COLUMNS)
+            entry = reused.get(record.id)
+            if entry is None or entry[0] != values:
+                text = render_asset(record)
+                entry = (values, text, count_tokens(text))
+                self.rendered_assets += 1
+            self.asset_rows[record.id] = entry
+
+        # Carrier CSVs only change on a full reload, so an unchanged list keeps all its rows
+        if previous is not None and previous.carrier_data is carrier_data:
+            self.line_rows = previous.line_rows
+        else:
+            self.line_rows: Dict[int, Tuple[str, int]] = {}
+            for line in carrier_data:
+                text = render_line(line)
+                self.line_rows[id(line)] = (text, count_tokens(text))
+        self.carrier_data = carrier_data  # keeps the lines alive, so their id() keys stay valid
+
+        # Categories cover the whole inventory and go into every prompt, sorted so the
+        # block is byte-identical from one question (and one refresh) to the next
+        texts = sorted((render_category(category) for category in categories), key=lambda text: (text.casefold(), text))
+        self.category_rows = [(text, count_tokens(text)) for text in texts]
+        self.categories_block, self.categories_tokens = _table(CATEGORY_HEADER, self.category_rows)
+
+    def asset_row(self, asset) -> Tuple[str, int]:
+        entry = self.asset_rows.get(asset.id)
+        if entry is None:
+            text = render_asset(asset)
+            return text, count_tokens(text)
+        return entry[1], entry[2]
+
+    def line_row(self, line) -> Tuple[str, int]:
+        entry = self.line_rows.get(id(line))
+        if entry is None:
+            text = render_line(line)
+            return text, count_tokens(text)
+        return entry
+
+    def fit(self, assets, lines, budget: int):
+        """Asset, carrier and category tables trimmed to ``budget`` tokens, plus the tokens used.
+
+        ``assets`` and ``lines`` are in relevance order, so trimming drops the
+        least relevant rows first; the rows kept are then sorted, so the same
+        selection always renders to the same text. The category table goes in
+        whole and only shares the budget if it would not fit on its own.
+        """
+        categories_block, category_tokens = self.categories_block, self.categories_tokens
+        if category_tokens > budget:
+            kept = _fit_sections([self.category_rows], budget - _header_tokens(CATEGORY_HEADER))[0]
+            categories_block, category_tokens = _table(CATEGORY_HEADER, self.category_rows[:kept])
+
+        asset_rows = [self.asset_row(asset) + (asset.id,) for asset in assets]
+        line_rows = [self.line_row(line) for line in lines]
+        headers = (ASSET_HEADER, LINE_HEADER)
+        kept = _fit_sections([asset_rows, line_rows],
+                             budget - category_tokens - sum(_header_tokens(header) for header in headers))
+        assets_block, asset_tokens = _table(ASSET_HEADER, sorted(asset_rows[:kept[0]], key=lambda row: row[2]))
+        lines_block, line_tokens = _table(LINE_HEADER, sorted(line_rows[:kept[1]]))
+        return assets_block, lines_block, categories_block, asset_tokens + line_tokens + category_tokens
@@ -0,0 +1,288 @@
+# app/query_engine.py
+import difflib
+import re
+from typing import Iterable, List, Optional
+from .asset_store import index_key
+from .reconcile import imei_key, sim_key
+from .retrieval import phone_key
+
+# Longest list the fast path will print before summarizing the rest
+LIST_LIMIT = 25
+
+# Snipe-IT status_meta values and the words people use for them
+STATUS_WORDS = {
+    "deployed": ("deployed", "in use", "checked out"),
+    "deployable": ("deployable", "available", "ready to deploy", "in stock", "spare"),
+    "pending": ("pending",),
+    "undeployable": ("undeployable", "broken", "out for repair"),
+    "archived": ("archived", "retired"),
+}
+
+_IMEI = re.compile(r"\bimei\b\W*(\d[\d\s-]{13,18}\d)", re.I)
+_SIM = re.compile(r"\b(?:sim|iccid)\b\W*(\d[\d\s-]{17,22}\d)", re.I)
+_PHONE = re.compile(r"(?<!\d)\+?1?[\s.-]?\(?(\d{3})\)?[\s.-]?(\d{3})[\s.-]?(\d{4})(?!\d)")
+_TAG = re.compile(r"\b(?:asset\s*tag|asset|tag)\s*(?:number|no\.?|#)?\s*[:#]?\s*([A-Za-z0-9-]*\d[A-Za-z0-9-]*)", re.I)
+_SERIAL = re.compile(r"\bserial\s*(?:number|no\.?|#)?\s*[:#]?\s*([A-Za-z0-9-]*\d[A-Za-z0-9-]*)", re.I)
+_BARE_NUMBER = re.compile(r"(?<![\w-])(\d{14,20})(?![\w-])")
+_USER = re.compile(
+    r"\b(?:assigned to|checked out to|belong(?:s|ing)? to|assets? (?:for|of)|devices? (?:for|of)|"
+    r"what does|what do|does)\s+([A-Za-z][A-Za-z0-9 .'-]*?)\s*(?:have|has|own|got|\?|$)", re.I)
+_LIMIT = re.compile(r"\b(?:first|top|last)\s+(\d{1,3})\b", re.I)
+_COUNT = re.compile(r"\b(?:how many|count of|number of|total)\b", re.I)
+_LIST = re.compile(r"\b(?:list|show|which|what are|give me|find)\b", re.I)
+# Counts and lists without a known category must name assets generically,
+# otherwise "how many iphones are unassigned" would be answered for every asset
+_GENERIC_NOUN = re.compile(r"\b(?:assets?|devices?|items?|equipment|hardware)\b", re.I)
+_UNASSIGNED = re.compile(r"\bunassigned\b|\bnot assigned\b")
+_WORD = re.compile(r"[\w']+")
+# Words that carry no meaning of their own in a count/list/user question. Once the filters
+# are taken out, anything else ("not", "2023", "purchased", a person's name) means the
+# question asks for more than the fast path understands, so it goes to the LLM.
+FILLER_WORDS = frozenset("""
+    a all an any are at can currently do does got have has how i in is located many me my
+    now of on our please right show tell that the there us we with you
+""".split())
+
+class ParsedQuery:
+    """What a chat message is asking for, if it's something the fast path can answer."""
+
+    def __init__(self, intent, identifier=None, id_kind=None, category=None, status=None,
+                 location=None, user=None, unassigned=False, limit=None):
+        self.intent = intent            # "lookup", "count", "list" or "user"
+        self.identifier = identifier    # tag/serial/IMEI/SIM/phone being looked up
+        self.id_kind = id_kind          # "tag", "serial", "imei", "sim" or "phone"
+        self.category = category
+        self.status = status
+        self.location = location
+        self.user = user
+        self.unassigned = unassigned
+        self.limit = limit
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in vars(self).items() if v not in (None, False))
+        return f"ParsedQuery({fields})"
+
+def _plural_forms(name):
+    name = name.casefold()
+    forms = {name, name + "s", name + "es"}
+    if name.endswith("y"):
+        forms.add(name[:-1] + "ies")
+    return forms
+
+def _phrase_pattern(name) -> str:
+    forms = sorted(_plural_forms(name), key=len, reverse=True)
+    return rf"(?<!\w)(?:{'|'.join(map(re.escape, forms))})(?!\w)"
+
+def _find_phrase(text, names: Iterable[str]) -> Optional[str]:
+    """Longest of ``names`` (or its plural) that appears in ``text`` as whole words."""
+    best = None
+    for name in names:
+        if not name:
+            continue
+        if re.search(_phrase_pattern(name), text) and (best is None or len(name) > len(best)):
+            best = name
+    return best
+
+def _find_status(text) -> Optional[str]:
+    for status, words in STATUS_WORDS.items():
+        if any(re.search(rf"\b{re.escape(word)}\b", text) for word in words):
+            return status
+    return None
+
+def _fully_understood(text, patterns) -> bool:
+    """True if nothing but filler words is left once every parsed part is taken out."""
+    for pattern in patterns:
+        text = re.sub(pattern, " ", text)
+    return all(word in FILLER_WORDS for word in _WORD.findall(text))
+
+def _parse_lookup(message) -> Optional[ParsedQuery]:
+    # Identifier lookups: explicit keyword first, then bare numbers by length
+    for pattern, kind in ((_IMEI, "imei"), (_SIM, "sim"), (_SERIAL, "serial"), (_TAG, "tag")):
+        match = pattern.search(message)
+        if match:
+            return ParsedQuery("lookup", identifier=match.group(1).strip(), id_kind=kind)
+    match = _BARE_NUMBER.search(message)
+    if match:
+        digits = match.group(1)
+        return ParsedQuery("lookup", identifier=digits, id_kind="imei" if len(digits) <= 16 else "sim")
+    match = _PHONE.search(message)
+    if match:
+        return ParsedQuery("lookup", identifier="".join(match.groups()), id_kind="phone")
+    return None
+
+def message_subject(message: str, categories: Iterable[str] = (), locations: Iterable[str] = ()) -> Optional[str]:
+    """The identifier, user, category or location a message names, or None."""
+    lookup = _parse_lookup(message)
+    if lookup is not None:
+        return lookup.identifier
+    match = _USER.search(message)
+    if match:
+        return match.group(1).strip()
+    text = " ".join(message.casefold().split())
+    return _find_phrase(text, categories) or _find_phrase(text, locations)
+
+def parse_query(message: str, categories: Iterable[str] = (), locations: Iterable[str] = ()) -> Optional[ParsedQuery]:
+    """Parse a chat message into a ParsedQuery, or None if it needs the LLM.
+
+    Counts, lists and user questions are only returned when every word of the
+    message is accounted for, so a clause the parser doesn't understand (a
+    negation, a date, a person) can never be silently dropped from the answer.
+    """
+    lookup = _parse_lookup(message)
+    if lookup is not None:
+        return lookup
+
+    text = " ".join(message.casefold().split())
+
+    category = _find_phrase(text, categories)
+    location = _find_phrase(text, locations)
+    status = _find_status(text)
+    unassigned = bool(_UNASSIGNED.search(text))
+    limit_match = _LIMIT.search(text)
+    limit = int(limit_match.group(1)) if limit_match else None
+    filters = dict(category=category, status=status, location=location, unassigned=unassigned)
+    known_noun = bool(category or _GENERIC_NOUN.search(text))
+
+    parsed = [_COUNT, _LIST, _GENERIC_NOUN, _UNASSIGNED, _LIMIT]
+    parsed += [_phrase_pattern(name) for name in (category, location) if name]
+    if status:
+        parsed += [rf"\b{re.escape(word)}\b" for word in STATUS_WORDS[status]]
+
+    # A user's assets, unless the question narrows them further (the user path can't filter)
+    match = _USER.search(message)
+    if match:
+        if any(filters.values()) or limit:
+            return None
+        user = match.group(1).strip()
+        if not _fully_understood(text, parsed + [re.escape(" ".join(match.group(0).casefold().split()))]):
+            return None
+        return ParsedQuery("user", user=user)
+
+    if not _fully_understood(text, parsed):
+        return None
+    if _COUNT.search(text) and known_noun:
+        return ParsedQuery("count", **filters)
+    if _LIST.search(text) and known_noun and (category or status or location or unassigned or limit):
+        return ParsedQuery("list", limit=limit, **filters)
+    return None
+
+def _filter_assets(store, query: ParsedQuery) -> List:
+    # Start from the narrowest indexed filter, then check the rest row by row
+    candidates = None
+    for field in ("category", "location", "status"):
+        value = getattr(query, field)
+        if value is not None:
+            matches = store.find(field, value)
+            if candidates is None or len(matches) < len(candidates):
+                candidates = matches
+    if query.unassigned:
+        unassigned = store.find("assigned_to", "Unassigned")
+        if candidates is None or len(unassigned) < len(candidates):
+            candidates = unassigned
+    if candidates is None:
+        candidates = list(store)
+
+    def keep(asset):
+        for field in ("category", "location", "status"):
+            value = getattr(query, field)
+            if value is not None and index_key(field, asset.get(field)) != index_key(field, value):
+                return False
+        return not query.unassigned or asset.assigned_to in (None, "", "Unassigned")
+
+    return [asset for asset in candidates if keep(asset)]
+
+def _describe_filters(query: ParsedQuery) -> str:
+    noun = query.category or "asset"
+    parts = [f"{noun}{'' if noun.endswith('s') else '(s)'}"]
+    if query.status:
+        parts.append(query.status)
+    if query.unassigned:
+        parts.append("unassigned")
+    if query.location:
+        parts.append(f"at {query.location}")
+    return " ".join(parts)
+
+def format_asset(asset) -> str:
+    return (f"Asset {asset.asset_tag} ({asset.name}): {asset.model}, {asset.category}, "
+            f"status {asset.status}, assigned to {asset.assigned_to}, location {asset.location}, "
+            f"serial {asset.serial}")
+
+def format_line(line) -> str:
+    return (f"{line.get('Carrier')} line {line.get('Phone Number')} ({line.get('Device Name')}): "
+            f"IMEI {line.get('IMEI')}, SIM {line.get('SIM')}, cost center {line.get('cost_center')}")
+
+def _format_list(rows, formatter, limit) -> List[str]:
+    shown = rows[:limit]
+    lines = [f"• {formatter(row)}" for row in shown]
+    if len(rows) > len(shown):
+        lines.append(f"…and {len(rows) - len(shown)} more.")
+    return lines
+
+def _lookup(query: ParsedQuery, snapshot) -> Optional[str]:
+    store = snapshot.assets
+    reconciliation = snapshot.reconciliation
+
+    if query.id_kind in ("tag", "serial"):
+        asset = store.get_by("asset_tag" if query.id_kind == "tag" else "serial", query.identifier)
+        if asset is None:
+            return None
+        answer = [format_asset(asset)]
+        line = reconciliation.line_by_asset_id.get(asset.id)
+        if line is not None:
+            answer.append(f"Carrier: {format_line(line)}")
+        return "\n".join(answer)
+
+    key = {"imei": imei_key, "sim": sim_key, "phone": phone_key}[query.id_kind](query.identifier)
+    lines = snapshot.retriever.lines_by_key.get(key, []) if key else []
+    if not lines:
+        # An IMEI or SIM that isn't on a carrier bill may still be an asset's serial
+        asset = store.by_serial(query.identifier)
+        return format_asset(asset) if asset is not None else None
+    answer = []
+    for line in lines:
+        answer.append(format_line(line))
+        asset = reconciliation.asset_by_line_id.get(id(line))
+        if asset is not None:
+            answer.append(f"Snipe-IT: {format_asset(asset)}")
+    return "\n".join(answer)
+
+def _user_assets(query: ParsedQuery, snapshot) -> Optional[str]:
+    store = snapshot.assets
+    assets = store.find("assigned_to", query.user)
+    if not assets:
+        users = [name for name in store.counts("assigned_to") if name and name != "Unassigned"]
+        close = difflib.get_close_matches(query.user, users, n=1, cutoff=0.8)
+        if not close:
+            return None
+        assets = store.find("assigned_to", close[0])
+    user = assets[0].assigned_to
+    linked = snapshot.reconciliation.line_by_asset_id
+    lines = [linked[asset.id] for asset in assets if asset.id in linked]
+    answer = [f"{user} has {len(assets)} asset(s):", *_format_list(assets, format_asset, LIST_LIMIT)]
+    if lines:
+        answer.append("Carrier lines:")
+        answer.extend(_format_list(lines, format_line, LIST_LIMIT))
+    return "\n".join(answer)
+
+def execute_query(query: ParsedQuery, snapshot) -> Optional[str]:
+    """Answer ``query`` from the snapshot, or None to let the LLM handle it."""
+    if query.intent == "lookup":
+        return _lookup(query, snapshot)
+    if query.intent == "user":
+        return _user_assets(query, snapshot)
+
+    assets = _filter_assets(snapshot.assets, query)
+    if query.intent == "count":
+        return f"There are {len(assets)} {_describe_filters(query)}."
+    limit = query.limit or LIST_LIMIT
+    if not assets:
+        return f"No {_describe_filters(query)} found."
+    return "\n".join([f"{len(assets)} {_describe_filters(query)}:", *_format_list(assets, format_asset, limit)])
+
+def answer_query(message: str, snapshot) -> Optional[str]:
+    """Fast path: a direct answer for structured questions, None for everything else."""
+    store = snapshot.assets
+    query = parse_query(message, store.counts("category"), store.counts("location"))
+    if query is None:
+        return None
+    return execute_query(query, snapshot)
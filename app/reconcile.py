@@ -0,0 +1,189 @@
+# app/reconcile.py
+import difflib
+import re
+from typing import Dict, List, Optional
+from .asset_store import AssetStore
+
+# Categories that carry a cellular line; assets in them with no line are "unbilled"
+MOBILE_CATEGORY_KEYWORDS = ("phone", "tablet", "ipad", "hotspot", "mobile", "cellular", "modem")
+
+# Asset fields included with each reconciled row
+ASSET_SUMMARY_FIELDS = ("id", "asset_tag", "name", "serial", "model", "category", "assigned_to", "location")
+
+FUZZY_NAME_CUTOFF = 0.85
+# Fuzzy matching only compares names that share a word starting with the same few letters
+NAME_PREFIX_CHARS = 3
+
+_NON_DIGITS = re.compile(r"\D")
+
+def luhn_valid(digits: str) -> bool:
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        n = int(ch)
+        if i % 2 == 1:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return total % 10 == 0
+
+def imei_key(value) -> Optional[str]:
+    """Join key for an IMEI: its 14-digit TAC + serial body, or None if it isn't a valid IMEI.
+
+    15 digits must pass the Luhn check; 14 digits (no check digit) and 16-digit
+    IMEISVs (software version instead of check digit) are accepted as-is.
+    """
+    digits = _NON_DIGITS.sub("", str(value or ""))
+    if len(digits) == 15:
+        return digits[:14] if luhn_valid(digits) else None
+    if len(digits) in (14, 16):
+        return digits[:14]
+    return None
+
+def sim_key(value) -> Optional[str]:
+    """Join key for a SIM ICCID: first 19 digits, since some exports drop the check digit."""
+    digits = _NON_DIGITS.sub("", str(value or ""))
+    return digits[:19] if len(digits) in (19, 20) else None
+
+def name_key(value) -> str:
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", str(value or "").casefold()).split())
+
+def _name_prefixes(name: str):
+    return {word[:NAME_PREFIX_CHARS] for word in name.split()}
+
+class _NameMatcher:
+    """Closest assignee name for a carrier Device Name.
+
+    difflib against every assignee is O(lines x users), so names are first
+    narrowed to those sharing a word prefix, and each distinct name is only
+    matched once.
+    """
+
+    def __init__(self, user_names):
+        self.users = set(user_names)
+        self.by_prefix = {}
+        for user in user_names:
+            for prefix in _name_prefixes(user):
+                self.by_prefix.setdefault(prefix, []).append(user)
+        self._matches = {}
+
+    def match(self, name: str) -> Optional[str]:
+        if name in self.users:
+            return name
+        if name not in self._matches:
+            candidates = dict.fromkeys(user for prefix in sorted(_name_prefixes(name))
+                                       for user in self.by_prefix.get(prefix, ()))
+            close = difflib.get_close_matches(name, list(candidates), n=1, cutoff=FUZZY_NAME_CUTOFF)
+            self._matches[name] = close[0] if close else None
+        return self._matches[name]
+
+def _custom_field_values(asset, *labels):
+    for label, value in asset.custom_values().items():
+        if value and any(word in label.casefold() for word in labels):
+            yield value
+
+def is_mobile_asset(asset) -> bool:
+    category = (asset.category or "").casefold()
+    return any(word in category for word in MOBILE_CATEGORY_KEYWORDS)
+
+def asset_summary(asset) -> Dict:
+    return {field: getattr(asset, field) for field in ASSET_SUMMARY_FIELDS}
+
+class Reconciliation:
+    """Carrier lines joined to Snipe-IT assets.
+
+    ``matched`` holds (line, asset, method) triples, where method is how the
+    pair was found: "imei", "sim" or "name". ``orphan_lines`` are carrier lines
+    with no asset; ``unbilled_devices`` are mobile assets with no carrier line.
+    """
+
+    def __init__(self, matched, orphan_lines, unbilled_devices):
+        self.matched = matched
+        self.orphan_lines = orphan_lines
+        self.unbilled_devices = unbilled_devices
+        # Carrier line for an asset id, for lookups from the asset side
+        self.line_by_asset_id = {asset.id: line for line, asset, _ in matched}
+        self.asset_by_line_id = {id(line): asset for line, asset, _ in matched}
+
+    def summary(self) -> Dict:
+        methods = {}
+        for _, _, method in self.matched:
+            methods[method] = methods.get(method, 0) + 1
+        return {
+            "matched": len(self.matched),
+            "matched_by": methods,
+            "orphan_lines": len(self.orphan_lines),
+            "unbilled_devices": len(self.unbilled_devices),
+        }
+
+    def rows(self, section: str, limit: Optional[int] = None) -> List[Dict]:
+        if section == "matched":
+            rows = ({"carrier": line, "asset": asset_summary(asset), "match": method}
+                    for line, asset, method in self.matched)
+        elif section == "orphan_lines":
+            rows = iter(self.orphan_lines)
+        elif section == "unbilled_devices":
+            rows = (asset_summary(asset) for asset in self.unbilled_devices)
+        else:
+            raise ValueError(f"Unknown reconciliation section: {section}")
+        return [row for _, row in zip(range(limit), rows)] if limit is not None else list(rows)
+
+def _identity_index(store: AssetStore):
+    by_imei, by_sim = {}, {}
+    for asset in store:
+        for value in (asset.serial, *_custom_field_values(asset, "imei")):
+            key = imei_key(value)
+            if key:
+                by_imei.setdefault(key, asset)
+        for value in (asset.serial, *_custom_field_values(asset, "sim", "iccid")):
+            key = sim_key(value)
+            if key:
+                by_sim.setdefault(key, asset)
+    return by_imei, by_sim
+
+def build_reconciliation(carrier_data, store: AssetStore) -> Reconciliation:
+    by_imei, by_sim = _identity_index(store)
+    matched, unmatched_lines = [], []
+    matched_ids = set()
+
+    # Exact joins on normalized identifiers first
+    for line in carrier_data:
+        asset, method = None, None
+        key = imei_key(line.get("IMEI"))
+        if key and key in by_imei:
+            asset, method = by_imei[key], "imei"
+        else:
+            key = sim_key(line.get("SIM"))
+            if key and key in by_sim:
+                asset, method = by_sim[key], "sim"
+        if asset is not None and asset.id not in matched_ids:
+            matched.append((line, asset, method))
+            matched_ids.add(asset.id)
+        else:
+            unmatched_lines.append(line)
+
+    # Then a fuzzy Device Name -> assigned_to match for what's left
+    assets_by_user = {}
+    for asset in store:
+        if asset.id not in matched_ids and asset.assigned_to and asset.assigned_to != "Unassigned":
+            assets_by_user.setdefault(name_key(asset.assigned_to), []).append(asset)
+    matcher = _NameMatcher(assets_by_user)
+
+    orphan_lines = []
+    for line in unmatched_lines:
+        asset = None
+        name = name_key(line.get("Device Name"))
+        if name and name != "unknown":
+            user = matcher.match(name)
+            candidates = [a for a in assets_by_user.get(user, ()) if a.id not in matched_ids] if user else []
+            # Prefer the user's phone/tablet over their laptop
+            candidates.sort(key=lambda a: not is_mobile_asset(a))
+            asset = candidates[0] if candidates else None
+        if asset is not None:
+            matched.append((line, asset, "name"))
+            matched_ids.add(asset.id)
+        else:
+            orphan_lines.append(line)
+
+    unbilled_devices = [asset for asset in store if asset.id not in matched_ids and is_mobile_asset(asset)]
+    return Reconciliation(matched, orphan_lines, unbilled_devices)
@@ -0,0 +1,124 @@
+# app/retrieval.py
+import heapq
+import itertools
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+from .asset_store import AssetStore
+from .reconcile import imei_key, sim_key
+
+ASSET_TEXT_FIELDS = ("name", "asset_tag", "serial", "model", "category", "status", "assigned_to", "location")
+CARRIER_TEXT_FIELDS = ("Device Name", "IMEI", "SIM", "Phone Number", "Carrier", "cost_center")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from has have how i in is it me many much of on or our show "
+    "the their there to us was we what which who whom whose with list give find tell all any".split()
+)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_PHONE = re.compile(r"\+?1?[\s.-]?\(?(\d{3})\)?[\s.-]?(\d{3})[\s.-]?(\d{4})\b")
+
+def tokenize(text) -> List[str]:
+    return [token for token in _TOKEN.findall(str(text or "").casefold()) if token not in STOPWORDS]
+
+def phone_key(value):
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits[-10:] if len(digits) >= 10 else None
+
+def identifier_candidates(question: str) -> List[str]:
+    """Things in a question that look like tags, serials, IMEIs, SIMs or phone numbers."""
+    candidates = ["".join(match.groups()) for match in _PHONE.finditer(question)]
+    for word in question.split():
+        word = word.strip(".,;:!?()[]{}\"'#")
+        if len(word) >= 4 and any(ch.isdigit() for ch in word):
+            candidates.append(word)
+    return candidates
+
+class RetrievalIndex:
+    """BM25 over assets and carrier lines, plus exact lookups on identifiers.
+
+    Built once per inventory snapshot. ``search`` returns exact identifier hits
+    first, then the best BM25 matches, so the prompt only carries the rows
+    that are relevant to the question.
+    """
+
+    def __init__(self, store: AssetStore, carrier_data, reconciliation=None):
+        # Doc ids 0..len(store)-1 are asset rows, the rest are carrier lines
+        self.store = store
+        self.carrier_data = carrier_data
+        self.doc_count = len(store) + len(carrier_data)
+        self.reconciliation = reconciliation
+
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        docs = itertools.chain(((asset, ASSET_TEXT_FIELDS) for asset in store),
+                               ((line, CARRIER_TEXT_FIELDS) for line in carrier_data))
+        for doc_id, (row, fields) in enumerate(docs):
+            terms = Counter(tokenize(" ".join(str(row.get(field) or "") for field in fields)))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 1.0
+
+        # Carrier lines by normalized identifier; assets use the store's own indexes
+        self.lines_by_key: Dict[str, list] = {}
+        for line in carrier_data:
+            for key in (imei_key(line.get("IMEI")), sim_key(line.get("SIM")), phone_key(line.get("Phone Number"))):
+                if key:
+                    self.lines_by_key.setdefault(key, []).append(line)
+
+    def _idf(self, term):
+        df = len(self.postings.get(term, ()))
+        n = self.doc_count
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def bm25(self, question: str, k: int) -> List[int]:
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(question)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for doc_id, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self.avg_doc_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores, key=scores.get)
+
+    def exact(self, question: str) -> Tuple[list, list]:
+        assets, lines = [], []
+        for candidate in identifier_candidates(question):
+            for field in ("asset_tag", "serial"):
+                asset = self.store.get_by(field, candidate)
+                if asset is not None:
+                    assets.append(asset)
+            for key in (imei_key(candidate), sim_key(candidate), phone_key(candidate)):
+                if key:
+                    lines.extend(self.lines_by_key.get(key, ()))
+        return assets, lines
+
+    def search(self, question: str, k: int) -> Tuple[list, list]:
+        """Up to ``k`` (assets, carrier lines) relevant to ``question``, best first."""
+        assets, lines = self.exact(question)
+        for doc_id in self.bm25(question, k):
+            if doc_id < len(self.store):
+                assets.append(self.store[doc_id])
+            else:
+                lines.append(self.carrier_data[doc_id - len(self.store)])
+
+        # Pull in the other side of any reconciled pair so the model sees both
+        if self.reconciliation is not None:
+            line_by_asset = self.reconciliation.line_by_asset_id
+            asset_by_line = self.reconciliation.asset_by_line_id
+            linked_lines = [line_by_asset[asset.id] for asset in assets if asset.id in line_by_asset]
+            assets.extend(asset_by_line[id(line)] for line in lines if id(line) in asset_by_line)
+            lines.extend(linked_lines)
+
+        return _unique(assets, lambda asset: asset.id)[:k], _unique(lines, id)[:k]
+
+def _unique(rows, key):
+    seen = set()
+    return [row for row in rows if not (key(row) in seen or seen.add(key(row)))]
@@ -0,0 +1,141 @@
+# app/sessions.py
+import re
+import sys
+import time
+from collections import OrderedDict, deque
+from .config import (SESSION_MAX_CONVERSATIONS, SESSION_TTL, SESSION_MAX_BYTES, SESSION_MAX_TURNS,
+                     SESSION_MAX_ROWS)
+from .query_engine import message_subject
+
+# Answers are kept verbatim up to this many characters; compacted turns keep far less
+ANSWER_CHARS = 2000
+SUMMARY_QUESTION_CHARS = 120
+SUMMARY_ANSWER_CHARS = 240
+SUMMARY_TURNS = 8
+
+# Rough fixed cost of a session's own objects, on top of the text and rows it holds
+SESSION_OVERHEAD_BYTES = 1024
+ROW_REF_BYTES = 8
+
+# Words that point back at something said earlier: "is it deployed?", "who has those?",
+# "and the serial?". A capitalised "IT" is the department, not a pronoun.
+_FOLLOW_UP = re.compile(
+    r"(?i:^\s*(?:and|also|what about|how about|same)\b)"
+    r"|\b(?:[Ii]t|[Ii]ts|[Ii]t's)\b"
+    r"|(?i:\b(?:they|them|their|those|these|that one|this one|he|she|him|his|her|the same)\b)")
+
+def is_follow_up(question: str) -> bool:
+    return bool(_FOLLOW_UP.search(question or ""))
+
+def names_own_subject(question: str, categories=(), locations=()) -> bool:
+    """True when a question names the identifier, user, category or location it is about.
+
+    "Which of those are at City Hall?" still needs the conversation for "those", but its
+    rows should come from City Hall, not from the earlier answers. "What does he have?"
+    only names a pronoun, so it doesn't count.
+    """
+    subject = message_subject(question or "", categories, locations)
+    return subject is not None and not _FOLLOW_UP.fullmatch(subject)
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+class Session:
+    """One conversation: its last few turns verbatim, one-line summaries of the
+    turns before those, and the assets and carrier lines its answers drew on."""
+    __slots__ = ("turns", "summary", "asset_ids", "lines", "expires_at", "size")
+
+    def __init__(self):
+        self.turns = deque()               # (question, answer), oldest first
+        self.summary = deque(maxlen=SUMMARY_TURNS)
+        self.asset_ids = []                # most recently surfaced first
+        self.lines = []
+        self.expires_at = 0.0
+        self.size = 0
+
+    def has_context(self) -> bool:
+        return bool(self.turns or self.summary)
+
+    def history(self):
+        """The conversation so far as chat messages, oldest first."""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system",
+                             "content": "Earlier in this conversation:\n" + "\n".join(self.summary)})
+        for question, answer in self.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def _measure(self):
+        text = sum(sys.getsizeof(q) + sys.getsizeof(a) for q, a in self.turns)
+        text += sum(sys.getsizeof(line) for line in self.summary)
+        self.size = SESSION_OVERHEAD_BYTES + text + ROW_REF_BYTES * (len(self.asset_ids) + len(self.lines))
+        return self.size
+
+class SessionStore:
+    """Sessions by conversation id, with LRU + TTL eviction and a cap on total bytes.
+
+    Sessions live in this process only, like the answer cache; a conversation
+    whose messages land on another worker just starts a new session there.
+    """
+
+    def __init__(self, maxsize=SESSION_MAX_CONVERSATIONS, ttl=SESSION_TTL, max_bytes=SESSION_MAX_BYTES,
+                 max_turns=SESSION_MAX_TURNS, max_rows=SESSION_MAX_ROWS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.max_rows = max_rows
+        self._sessions = OrderedDict()   # conversation id -> Session
+        self.bytes = 0
+        self.counters = {"follow_ups": 0, "compactions": 0, "evictions": 0, "expirations": 0}
+
+    def _discard(self, conversation_id):
+        self.bytes -= self._sessions.pop(conversation_id).size
+
+    def get(self, conversation_id):
+        session = self._sessions.get(conversation_id)
+        if session is None:
+            return None
+        if session.expires_at < time.monotonic():
+            self._discard(conversation_id)
+            self.counters["expirations"] += 1
+            return None
+        self._sessions.move_to_end(conversation_id)
+        return session
+
+    def _compact(self, session):
+        # Older turns shrink to a line each, so a long conversation stays small
+        while len(session.turns) > self.max_turns:
+            question, answer = session.turns.popleft()
+            session.summary.append(f"Q: {_clip(question, SUMMARY_QUESTION_CHARS)} "
+                                   f"A: {_clip(answer, SUMMARY_ANSWER_CHARS)}")
+            self.counters["compactions"] += 1
+
+    def record(self, conversation_id, question, answer, assets=(), lines=()):
+        """Add a turn, and the rows it surfaced, to the conversation's session."""
+        if self.maxsize <= 0:
+            return
+        session = self.get(conversation_id)
+        if session is None:
+            session = self._sessions[conversation_id] = Session()
+        self.bytes -= session.size
+
+        session.turns.append((question, answer[:ANSWER_CHARS]))
+        self._compact(session)
+        ids = [asset.id for asset in assets]
+        session.asset_ids = list(dict.fromkeys(ids + session.asset_ids))[:self.max_rows]
+        session.lines = list({id(line): line for line in [*lines, *session.lines]}.values())[:self.max_rows]
+        session.expires_at = time.monotonic() + self.ttl
+
+        self.bytes += session._measure()
+        while len(self._sessions) > self.maxsize or self.bytes > self.max_bytes:
+            self._discard(next(iter(self._sessions)))
+            self.counters["evictions"] += 1
+
+    def stats(self):
+        return {**self.counters, "conversations": len(self._sessions), "bytes": self.bytes}
+
+session_store = SessionStore()
@@ -0,0 +1,154 @@
+# app/snapshot_store.py
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+import zlib
+from pathlib import Path
+from .config import SNAPSHOT_DB, SNAPSHOT_KEEP_VERSIONS, SNAPSHOT_LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KINDS = ("assets", "carrier_data", "categories", "fieldsets", "models")
+
+class LeadershipLost(Exception):
+    """Raised by ``save`` when this worker is no longer the leader."""
+
+class SnapshotStore:
+    """Versioned inventory snapshots in a SQLite file shared by every worker.
+
+    One worker, the leader, talks to Snipe-IT and writes each new snapshot;
+    the others pick up new versions as they appear. WAL mode lets readers
+    keep reading while the leader writes. On restart every worker comes up
+    from the latest version on disk.
+
+    The leader holds a lease: a row in the database that it renews well
+    within SNAPSHOT_LEASE_SECONDS. A worker takes the lease over once it
+    has expired, and ``save`` only writes while the lease is still ours, so
+    a stalled leader can't write over its successor. Being a database row,
+    this works the same on every platform.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.is_leader = False
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def try_become_leader(self) -> bool:
+        """Take the lease if it is free or expired, or renew it if it's ours."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT owner, expires_at FROM leader WHERE id = 1").fetchone()
+                self.is_leader = row is None or row[0] == self.owner or row[1] < now
+                if self.is_leader:
+                    conn.execute("INSERT OR REPLACE INTO leader (id, owner, expires_at) VALUES (1, ?, ?)",
+                                 (self.owner, now + SNAPSHOT_LEASE_SECONDS))
+        finally:
+            conn.close()
+        return self.is_leader
+
+    def release_leadership(self):
+        """Give the lease up, so another worker takes over without waiting for it to expire."""
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM leader WHERE id = 1 AND owner = ?", (self.owner,))
+        finally:
+            conn.close()
+
+    def _connect(self, readonly=False):
+        if readonly:
+            return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+            version INTEGER PRIMARY KEY, created_at REAL NOT NULL, synced_until TEXT NOT NULL)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS snapshot_data (
+            version INTEGER NOT NULL, kind TEXT NOT NULL, payload BLOB NOT NULL,
+            PRIMARY KEY (version, kind))""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS leader (
+            id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT NOT NULL, expires_at REAL NOT NULL)""")
+        return conn
+
+    def save(self, snapshot) -> int:
+        """Write ``snapshot`` as a new version and return its version number."""
+        payloads = {
+            "assets": [asset.to_dict() for asset in snapshot.assets],
+            "carrier_data": [dict(line) for line in snapshot.carrier_data],
+            "categories": snapshot.categories,
+            "fieldsets": snapshot.fieldsets,
+            "models": snapshot.models,
+        }
+        # Encoded before the write lock is taken, so followers renewing or reading aren't held up
+        payloads = {kind: zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 1)
+                    for kind, data in payloads.items()}
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT owner FROM leader WHERE id = 1").fetchone()
+                if row is None or row[0] != self.owner:
+                    self.is_leader = False
+                    raise LeadershipLost("another worker holds the snapshot store lease")
+                version = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM snapshots").fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO snapshot_data (version, kind, payload) VALUES (?, ?, ?)",
+                    [(version, kind, payload) for kind, payload in payloads.items()])
+                # The snapshots row goes in last, so readers never see a version without its data
+                conn.execute("INSERT INTO snapshots (version, created_at, synced_until) VALUES (?, ?, ?)",
+                             (version, time.time(), snapshot.synced_until))
+                conn.execute("DELETE FROM snapshot_data WHERE version <= ?", (version - SNAPSHOT_KEEP_VERSIONS,))
+                conn.execute("DELETE FROM snapshots WHERE version <= ?", (version - SNAPSHOT_KEEP_VERSIONS,))
+            return version
+        finally:
+            conn.close()
+
+    def latest_version(self):
+        if not self.path.exists():
+            return None
+        conn = self._connect(readonly=True)
+        try:
+            return conn.execute("SELECT MAX(version) FROM snapshots").fetchone()[0]
+        except sqlite3.OperationalError:
+            return None  # the leader hasn't created the tables yet
+        finally:
+            conn.close()
+
+    def load(self, version=None):
+        """The stored snapshot as a dict of kind -> rows plus version metadata, or None."""
+        if not self.path.exists():
+            return None
+        conn = self._connect(readonly=True)
+        try:
+            if version is None:
+                version = conn.execute("SELECT MAX(version) FROM snapshots").fetchone()[0]
+            if version is None:
+                return None
+            row = conn.execute("SELECT created_at FROM snapshots WHERE version = ?", (version,)).fetchone()
+            if row is None:
+                return None
+            data = {kind: json.loads(zlib.decompress(payload))
+                    for kind, payload in conn.execute(
+                        "SELECT kind, payload FROM snapshot_data WHERE version = ?", (version,))}
+            if set(data) != set(SNAPSHOT_KINDS):
+                return None
+            return {"version": version, "created_at": row[0], **data}
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not read snapshot store {self.path}: {e}")
+            return None
+        finally:
+            conn.close()
+
+# None when SNAPSHOT_DB is empty: every worker then loads on its own, as before
+snapshot_store = SnapshotStore(SNAPSHOT_DB) if SNAPSHOT_DB else None
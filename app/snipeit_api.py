@@ -1,14 +1,13 @@
 # app/snipeit_api.py
-import requests
-import json
-import os
-import tempfile
+import asyncio
+import httpx
 import logging
 from fastapi import HTTPException
-from .config import SNIPE_IT_API_URL, SNIPE_IT_API_KEY, DEBUG
-
-# Use temp directory instead of cleaned_data
-DATA_DIR = tempfile.gettempdir()
+from .http_client import get_http_client
+from .metrics import Counter
+from .asset_store import custom_value, fieldset_field_names
+from .config import (SNIPE_IT_API_URL, SNIPE_IT_API_KEY, DEBUG, SNIPE_IT_PAGE_SIZE,
+                     SNIPE_IT_MAX_CONCURRENCY, SNIPE_IT_MAX_RETRIES, SNIPE_IT_TIMEOUT)
 
 # Set up logging based on DEBUG flag
 if DEBUG:
@@ -19,82 +18,154 @@ else:
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.WARNING)
 
-def get_snipeit_assets(debug=False):
-    headers = {
-        "Authorization": f"Bearer {SNIPE_IT_API_KEY}",
-        "Accept": "application/json"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF_SECONDS = 0.5
+
+snipeit_pages_total = Counter("assetbot_snipeit_pages_total", "Snipe-IT page requests, by endpoint and outcome",
+                              ["endpoint", "outcome"])
+
+HEADERS = {
+    "Authorization": f"Bearer {SNIPE_IT_API_KEY}",
+    "Accept": "application/json"
+}
+
+def _retry_delay(response, attempt):
+    # Honour Retry-After on 429s, otherwise back off exponentially
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return RETRY_BACKOFF_SECONDS * (2 ** attempt)
+
+async def _get_page(client, endpoint, params, semaphore):
+    response = None
+    for attempt in range(SNIPE_IT_MAX_RETRIES + 1):
+        error = None
+        async with semaphore:
+            try:
+                response = await client.get(f"{SNIPE_IT_API_URL}{endpoint}", params=params,
+                                            headers=HEADERS, timeout=SNIPE_IT_TIMEOUT)
+            except httpx.TransportError as e:
+                response, error = None, e
+
+        if response is not None and response.status_code == 200:
+            snipeit_pages_total.inc(endpoint=endpoint, outcome="ok")
+            return response.json()
+
+        retryable = response is None or response.status_code in RETRY_STATUS_CODES
+        if not retryable or attempt == SNIPE_IT_MAX_RETRIES:
+            break
+        snipeit_pages_total.inc(endpoint=endpoint, outcome="retry")
+
+        delay = _retry_delay(response, attempt)
+        logger.warning(f"Snipe-IT {endpoint} offset={params.get('offset')} failed "
+                       f"({error or response.status_code}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    snipeit_pages_total.inc(endpoint=endpoint, outcome="error")
+    status = response.status_code if response is not None else "connection error"
+    raise HTTPException(status_code=500, detail=f"Snipe-IT API error: {status}")
+
+async def fetch_all_rows(endpoint, params=None):
+    """Fetch every row of a paginated Snipe-IT endpoint.
+
+    The first page tells us ``total``; the remaining pages are requested in
+    parallel, capped at SNIPE_IT_MAX_CONCURRENCY requests in flight.
+    """
+    client = get_http_client()
+    semaphore = asyncio.Semaphore(SNIPE_IT_MAX_CONCURRENCY)
+    params = dict(params or {})
+
+    first_page = await _get_page(client, endpoint, {**params, "limit": SNIPE_IT_PAGE_SIZE, "offset": 0}, semaphore)
+    rows = first_page.get("rows", [])
+    total = int(first_page.get("total") or len(rows))
+
+    # The server may cap `limit` below what we asked for, so step by what it actually returned
+    page_size = min(len(rows), SNIPE_IT_PAGE_SIZE) or SNIPE_IT_PAGE_SIZE
+    pages = await asyncio.gather(*[
+        _get_page(client, endpoint, {**params, "limit": page_size, "offset": offset}, semaphore)
+        for offset in range(len(rows), total, page_size)
+    ])
+    for page in pages:
+        rows.extend(page.get("rows", []))
+
+    # Rows can shift between pages if inventory changes mid-fetch; drop repeats
+    seen = set()
+    unique_rows = []
+    for row in rows:
+        row_id = row.get("id")
+        if row_id is not None:
+            if row_id in seen:
+                continue
+            seen.add(row_id)
+        unique_rows.append(row)
+
+    logger.info(f"Fetched {len(unique_rows)}/{total} rows from {endpoint} in {len(pages) + 1} pages")
+    return unique_rows
+
+async def fetch_rows_updated_since(endpoint, since, params=None):
+    """Fetch rows changed at or after ``since`` (a Snipe-IT "Y-m-d H:i:s" timestamp).
+
+    Pages are walked newest-first with ``sort=updated_at`` and the walk stops at
+    the first row older than ``since``, so a quiet tenant costs a single request.
+    """
+    client = get_http_client()
+    semaphore = asyncio.Semaphore(1)
+    params = {**(params or {}), "sort": "updated_at", "order": "desc", "limit": SNIPE_IT_PAGE_SIZE}
+
+    rows = []
+    offset = 0
+    while True:
+        page = await _get_page(client, endpoint, {**params, "offset": offset}, semaphore)
+        page_rows = page.get("rows", [])
+        for row in page_rows:
+            # Rows stamped in the same second as the watermark are re-fetched; merging is idempotent
+            if _updated_at(row) < since:
+                return rows
+            rows.append(row)
+        offset += len(page_rows)
+        if not page_rows or offset >= int(page.get("total") or 0):
+            return rows
+
+def _updated_at(asset):
+    return (asset.get("updated_at") or {}).get("datetime") or ""
+
+def format_asset(asset):
+    return {
+        "id": asset.get("id", "UNKNOWN"),
+        "name": asset.get("name", "UNKNOWN"),
+        "asset_tag": asset.get("asset_tag", "UNKNOWN"),
+        "serial": asset.get("serial", "UNKNOWN"),
+        "model": asset.get("model", {}).get("name", "UNKNOWN"),
+        "model_id": (asset.get("model") or {}).get("id"),
+        "category": asset.get("category", {}).get("name", "UNKNOWN"),
+        "status": asset.get("status_label", {}).get("status_meta", "UNKNOWN"),
+        "assigned_to": (asset.get("assigned_to") or {}).get("name", "Unassigned"),
+        "location": (asset.get("location") or {}).get("name", "UNKNOWN"),
+        "last_checkout": (asset.get("last_checkout") or {}).get("formatted", "Never"),
+        "updated_at": _updated_at(asset),
+        # Label -> value only; the AssetStore projects these onto the model's fieldset
+        "custom_fields": {label: custom_value(field) for label, field in (asset.get("custom_fields") or {}).items()}
     }
-    
-    # Remove limit or set to a very high value to get all assets
-    response = requests.get(f"{SNIPE_IT_API_URL}/hardware", headers=headers)
-    
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Snipe-IT API error: {response.status_code}")
-    
-    assets_json = response.json().get("rows", [])
-    logger = logging.getLogger(__name__)
-    logger.warning(f"Retrieved {len(assets_json)} assets from API")
-    
-    # Search for asset tag 00427
-    asset_427 = next((asset for asset in assets_json if asset.get("asset_tag") == "00427"), None)
-    if asset_427:
-        logger.warning(f"Found asset 00427: {asset_427}")
-    else:
-        logger.warning(f"Asset tag 00427 NOT FOUND in API response")
-        # Log the first 5 asset tags to see what's available
-        first_5_tags = [asset.get("asset_tag") for asset in assets_json[:5]]
-        logger.warning(f"First 5 asset tags: {first_5_tags}")
-
-    formatted_assets = [
-        {
-            "id": asset.get("id", "UNKNOWN"),
-            "name": asset.get("name", "UNKNOWN"),
-            "asset_tag": asset.get("asset_tag", "UNKNOWN"),
-            "serial": asset.get("serial", "UNKNOWN"),
-            "model": asset.get("model", {}).get("name", "UNKNOWN"),
-            "category": asset.get("category", {}).get("name", "UNKNOWN"),
-            "status": asset.get("status_label", {}).get("status_meta", "UNKNOWN"),
-            "assigned_to": (asset.get("assigned_to") or {}).get("name", "Unassigned"),
-            "location": (asset.get("location") or {}).get("name", "UNKNOWN"),
-            "last_checkout": (asset.get("last_checkout") or {}).get("formatted", "Never"),
-            "custom_fields": asset.get("custom_fields", {})
-        }
-        for asset in assets_json
-    ]
 
-    if debug:
-        logger.info(f"Retrieved {len(assets_json)} assets from API")
-        
-        # Log all asset tags to see if 00427 is among them
-        all_asset_tags = [asset.get("asset_tag") for asset in assets_json]
-        logger.info(f"All asset tags: {all_asset_tags}")
-        
-        # Check for specific asset tag
-        asset_427 = next((a for a in assets_json if a.get("asset_tag") == "00427"), None)
-        if asset_427:
-            logger.info(f"Found asset 00427 in API response: {asset_427}")
-        else:
-            logger.info("Asset tag 00427 not found in API response")
-
-    # Write to JSON for debugging
-    if debug:
-        with open(f"{DATA_DIR}/snipeit_assets.json", "w") as json_file:
-            json.dump(formatted_assets, json_file, indent=4)
-        print(f"✔ Debug JSON saved to {DATA_DIR}/snipeit_assets.json")
+async def get_snipeit_assets_updated_since(since):
+    assets_json = await fetch_rows_updated_since("/hardware", since)
+    logger.info(f"Retrieved {len(assets_json)} assets updated since {since}")
+    return [format_asset(asset) for asset in assets_json]
 
-    return formatted_assets  # Store in-memory instead of always saving
+async def get_snipeit_assets():
+    assets_json = await fetch_all_rows("/hardware")
+    logger.info(f"Retrieved {len(assets_json)} assets from API")
 
-def get_snipeit_categories(debug=False):
-    headers = {
-        "Authorization": f"Bearer {SNIPE_IT_API_KEY}",
-        "Accept": "application/json"
-    }
-    response = requests.get(f"{SNIPE_IT_API_URL}/categories", headers=headers)
+    # Asset lookups (e.g. by tag) go through the AssetStore indexes built from this list
+    formatted_assets = [format_asset(asset) for asset in assets_json]
 
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Snipe-IT API error: {response.status_code}")
+    return formatted_assets  # Store in-memory instead of always saving
 
-    categories_json = response.json().get("rows", [])
+async def get_snipeit_categories():
+    categories_json = await fetch_all_rows("/categories")
     formatted_categories = [
         {
             "id": category.get("id", "UNKNOWN"),
@@ -111,53 +182,24 @@ def get_snipeit_categories(debug=False):
         for category in categories_json
     ]
 
-    # Write to JSON for debugging
-    if debug:
-        with open(f"{DATA_DIR}/snipeit_categories.json", "w") as json_file:
-            json.dump(formatted_categories, json_file, indent=4)
-        print(f"✔ Debug JSON saved to {DATA_DIR}/snipeit_categories.json")
-
     return formatted_categories  # Store in-memory instead of always saving
 
-def get_snipeit_fieldsets(debug=False):
-    headers = {
-        "Authorization": f"Bearer {SNIPE_IT_API_KEY}",
-        "Accept": "application/json"
-    }
-    response = requests.get(f"{SNIPE_IT_API_URL}/fieldsets", headers=headers)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Snipe-IT API error: {response.status_code}")
-
-    fieldsets_json = response.json().get("rows", [])
+async def get_snipeit_fieldsets():
+    fieldsets_json = await fetch_all_rows("/fieldsets")
     formatted_fieldsets = [
         {
             "id": fieldset.get("id", "UNKNOWN"),
             "name": fieldset.get("name", "UNKNOWN"),
-            "fields": fieldset.get("fields", [])
+            # Snipe-IT nests these as {"total": n, "rows": [{"name": ...}, ...]}
+            "fields": fieldset_field_names(fieldset.get("fields"))
         }
         for fieldset in fieldsets_json
     ]
 
-    # Write to JSON for debugging
-    if debug:
-        with open(f"{DATA_DIR}/snipeit_fieldsets.json", "w") as json_file:
-            json.dump(formatted_fieldsets, json_file, indent=4)
-        print(f"✔ Debug JSON saved to {DATA_DIR}/snipeit_fieldsets.json")
-
     return formatted_fieldsets  # Store in-memory instead of always saving
 
-def get_snipeit_models(debug=False):
-    headers = {
-        "Authorization": f"Bearer {SNIPE_IT_API_KEY}",
-        "Accept": "application/json"
-    }
-    response = requests.get(f"{SNIPE_IT_API_URL}/models", headers=headers)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Snipe-IT API error: {response.status_code}")
-
-    models_json = response.json().get("rows", [])
+async def get_snipeit_models():
+    models_json = await fetch_all_rows("/models")
     formatted_models = [
         {
             "id": model.get("id", "UNKNOWN"),
@@ -167,30 +209,4 @@ def get_snipeit_models(debug=False):
         for model in models_json
     ]
 
-    # Write to JSON for debugging
-    if debug:
-        with open(f"{DATA_DIR}/snipeit_models.json", "w") as json_file:
-            json.dump(formatted_models, json_file, indent=4)
-        print(f"✔ Debug JSON saved to {DATA_DIR}/snipeit_models.json")
-
     return formatted_models  # Store in-memory instead of always saving
-
-# app/main.py
-from fastapi import FastAPI, Request, HTTPException
-from typing import Tuple
-from .normalize_carrier import normalize_carrier_data
-from .snipeit_api import get_snipeit_assets, get_snipeit_categories, get_snipeit_fieldsets, get_snipeit_models
-from .openai_integration import query_openai
-
-app = FastAPI()
-
-# Load and store carrier data + Snipe-IT data at startup
-carrier_data = normalize_carrier_data(debug=True)
-snipeit_data = get_snipeit_assets(debug=True)
-snipeit_categories = get_snipeit_categories(debug=True)
-snipeit_fieldsets = get_snipeit_fieldsets(debug=True)
-snipeit_models = get_snipeit_models(debug=True)
-
-@app.post("/chat")
-async def chat_with_assets(request: Request):
-    return await process_chat(request, carrier_data, snipeit_data, snipeit_categories, snipeit_fieldsets, snipeit_models)
\ No newline at end of file
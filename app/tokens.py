@@ -0,0 +1,24 @@
+# app/tokens.py
+import importlib.util
+from functools import lru_cache
+from .config import OPENAI_MODEL
+
+# Exact counts use tiktoken (in requirements.txt). Without it we assume ~3 characters per token,
+# which overestimates: serials, IMEIs and phone numbers tokenize worse than the ~4 of prose
+FALLBACK_CHARS_PER_TOKEN = 3
+TIKTOKEN_ENABLED = importlib.util.find_spec("tiktoken") is not None
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: str = OPENAI_MODEL) -> int:
+    if not text:
+        return 0
+    if TIKTOKEN_ENABLED:
+        return len(_encoding(model).encode(text, disallowed_special=()))
+    return (len(text) + FALLBACK_CHARS_PER_TOKEN - 1) // FALLBACK_CHARS_PER_TOKEN
@@ -0,0 +1,127 @@
+# app/worker.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from .metrics import stage_seconds, current_trace_id, set_trace_id
+from .config import CHAT_WORKERS, CHAT_QUEUE_SIZE, CHAT_DEDUP_WINDOW
+
+logger = logging.getLogger(__name__)
+
+class ActivityQueue:
+    """Bounded queue of Teams activities drained by a pool of workers.
+
+    Activities from the same conversation are handled one at a time, in the
+    order they arrived; different conversations run in parallel. Each
+    conversation keeps its own pending activities, and only a conversation
+    with nothing running is handed to a worker, so a burst from one chat
+    waits in its own line instead of tying up every worker. Activity ids
+    handled recently, or still queued, are dropped, so Bot Framework retries
+    don't produce duplicate answers; an activity that fails is not remembered,
+    so its redelivery is handled.
+    """
+
+    def __init__(self, workers=CHAT_WORKERS, maxsize=CHAT_QUEUE_SIZE, dedup_window=CHAT_DEDUP_WINDOW):
+        self.worker_count = workers
+        self.maxsize = maxsize
+        self.dedup_window = dedup_window
+        self._ready = None               # conversation ids with pending activities and no worker
+        self._workers = []
+        self._handler = None
+        self._pending = {}               # conversation id -> deque of (enqueued_at, trace id, activity)
+        self._seen_ids = OrderedDict()   # ids handled successfully, oldest first
+        self._queued_ids = set()         # ids queued or being handled
+        self.depth = 0
+        self.counters = {"enqueued": 0, "processed": 0, "failed": 0, "duplicates": 0, "rejected_full": 0}
+        self.max_depth = 0
+        self.in_flight = 0
+        self._total_wait = 0.0
+
+    def start(self, handler):
+        self._handler = handler
+        self._ready = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _is_duplicate(self, activity_id):
+        if activity_id in self._queued_ids:
+            return True
+        if activity_id in self._seen_ids:
+            self._seen_ids.move_to_end(activity_id)
+            return True
+        return False
+
+    def _remember(self, activity_id):
+        self._seen_ids[activity_id] = None
+        if len(self._seen_ids) > self.dedup_window:
+            self._seen_ids.popitem(last=False)
+
+    def enqueue(self, activity) -> str:
+        """Queue an activity; returns "queued", "duplicate" or "full"."""
+        if self._ready is None:
+            raise RuntimeError("ActivityQueue.start() has not been called")
+        if self.depth >= self.maxsize:
+            self.counters["rejected_full"] += 1
+            return "full"
+        if self._is_duplicate(activity["id"]):
+            self.counters["duplicates"] += 1
+            return "duplicate"
+        self._queued_ids.add(activity["id"])
+        conversation_id = activity["conversation"]["id"]
+        pending = self._pending.get(conversation_id)
+        if pending is None:
+            # Idle conversation: it joins the line for a worker
+            pending = self._pending[conversation_id] = deque()
+            self._ready.put_nowait(conversation_id)
+        pending.append((time.monotonic(), current_trace_id(), activity))
+        self.depth += 1
+        self.counters["enqueued"] += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        return "queued"
+
+    async def _work(self):
+        while True:
+            conversation_id = await self._ready.get()
+            pending = self._pending[conversation_id]
+            enqueued_at, trace_id, activity = pending.popleft()
+            self.depth -= 1
+            # Spans and logs from handling this activity carry the trace id of the /chat request
+            set_trace_id(trace_id)
+            wait = time.monotonic() - enqueued_at
+            self._total_wait += wait
+            stage_seconds.observe(wait, stage="queue_wait")
+            self.in_flight += 1
+            try:
+                await self._handler(activity)
+                self.counters["processed"] += 1
+                self._remember(activity["id"])
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.error(f"Failed to handle activity {activity.get('id')} (trace {trace_id}): {e}")
+            finally:
+                self.in_flight -= 1
+                self._queued_ids.discard(activity["id"])
+                # One activity per turn: a busy conversation goes to the back of the line
+                if pending:
+                    self._ready.put_nowait(conversation_id)
+                else:
+                    del self._pending[conversation_id]
+
+    def stats(self):
+        handled = self.counters["processed"] + self.counters["failed"]
+        return {
+            **self.counters,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "capacity": self.maxsize,
+            "in_flight": self.in_flight,
+            "workers": self.worker_count,
+            "avg_wait_seconds": round(self._total_wait / handled, 4) if handled else 0.0,
+        }
+
+activity_queue = ActivityQueue()
@@ -0,0 +1,195 @@
+# bench/fake_services.py
+"""Local stand-ins for Snipe-IT, OpenAI and the Bot Framework, for benchmarking.
+
+Run on its own (``python -m bench.fake_services --assets 10000 --port 8765``)
+or let ``bench.run`` start it. Point the app at it with:
+
+    SNIPE_IT_API_URL=http://127.0.0.1:8765/api/v1
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+    AZURE_AUTH_URL=http://127.0.0.1:8765/oauth2/token
+
+and send activities whose serviceUrl is http://127.0.0.1:8765.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CATEGORIES = ("Smartphone", "Laptop", "Tablet", "Desktop", "Monitor", "Hotspot")
+STATUSES = ("deployed", "deployable", "pending", "archived", "undeployable")
+LOCATIONS = ("City Hall", "Public Works", "Fire Station 24", "Fire Station 25", "Police", "Rosehill")
+MODEL_COUNT = 60
+FIELDSET_COUNT = 6
+USER_COUNT = 400
+
+def make_asset(i):
+    category = CATEGORIES[i % len(CATEGORIES)]
+    model_id = i % MODEL_COUNT + 1
+    return {
+        "id": i,
+        "name": f"{category}-{i:06d}",
+        "asset_tag": f"{i:05d}",
+        "serial": f"SN{i:08d}",
+        "model": {"id": model_id, "name": f"Model {model_id}"},
+        "category": {"id": CATEGORIES.index(category) + 1, "name": category},
+        "status_label": {"name": STATUSES[i % len(STATUSES)].title(), "status_meta": STATUSES[i % len(STATUSES)]},
+        "assigned_to": {"name": f"User {i % USER_COUNT}"} if i % 5 else None,
+        "location": {"name": LOCATIONS[i % len(LOCATIONS)]},
+        "last_checkout": {"formatted": "2025-01-15 09:00"} if i % 5 else None,
+        "updated_at": {"datetime": f"2025-01-{i % 28 + 1:02d} {i % 24:02d}:{i % 60:02d}:00"},
+        "custom_fields": {
+            "IMEI": {"field": "_snipeit_imei_1", "value": f"35{i:013d}", "field_format": "ANY", "element": "text"},
+            "Phone Number": {"field": "_snipeit_phone_number_2", "value": f"425{i % 10000000:07d}",
+                             "field_format": "ANY", "element": "text"},
+            "MAC Address": {"field": "_snipeit_mac_address_3", "value": None, "field_format": "MAC",
+                            "element": "text"},
+        },
+    }
+
+def make_models():
+    return [{"id": k, "name": f"Model {k}", "fieldset_id": k % FIELDSET_COUNT + 1,
+             "category": {"id": k % len(CATEGORIES) + 1, "name": CATEGORIES[k % len(CATEGORIES)]}}
+            for k in range(1, MODEL_COUNT + 1)]
+
+def make_fieldsets():
+    fields = [{"id": 1, "name": "IMEI", "db_column_name": "_snipeit_imei_1"},
+              {"id": 2, "name": "Phone Number", "db_column_name": "_snipeit_phone_number_2"},
+              {"id": 3, "name": "MAC Address", "db_column_name": "_snipeit_mac_address_3"}]
+    return [{"id": k, "name": f"Fieldset {k}", "fields": {"total": len(fields), "rows": fields}}
+            for k in range(1, FIELDSET_COUNT + 1)]
+
+def make_categories(asset_count):
+    return [{"id": k + 1, "name": name, "category_type": "asset", "item_count": asset_count // len(CATEGORIES),
+             "assets_count": asset_count // len(CATEGORIES)} for k, name in enumerate(CATEGORIES)]
+
+class FakeServices:
+    def __init__(self, assets=1000, page_max=500, snipeit_latency=0.02, openai_latency=0.5,
+                 openai_tokens=60, openai_token_interval=0.01, bot_latency=0.03):
+        self.assets = [make_asset(i) for i in range(1, assets + 1)]
+        self.tables = {"hardware": self.assets, "models": make_models(), "fieldsets": make_fieldsets(),
+                       "categories": make_categories(assets)}
+        self.page_max = page_max
+        self.snipeit_latency = snipeit_latency
+        self.openai_latency = openai_latency
+        self.openai_tokens = openai_tokens
+        self.openai_token_interval = openai_token_interval
+        self.bot_latency = bot_latency
+        # replyToId -> time (time.time(), shared with the load generator) the last reply text arrived
+        self.replies = {}
+        self.counters = {"snipeit_pages": 0, "completions": 0, "bot_posts": 0, "bot_updates": 0, "tokens": 0,
+                         "cached_tokens": 0}
+        self.prompt_prefixes = set()
+
+    def cached_tokens(self, messages):
+        """Roughly how OpenAI's prefix cache behaves: leading messages seen before count as cached,
+        in 128-token steps, once the cached prefix is at least 1024 tokens."""
+        prefix, tokens, cached = (), 0, 0
+        for message in messages:
+            prefix += (message.get("role"), str(message.get("content", "")))
+            tokens += len(prefix[-1]) // 4
+            if prefix in self.prompt_prefixes:
+                cached = tokens
+            self.prompt_prefixes.add(prefix)
+        return cached // 128 * 128 if cached >= 1024 else 0
+
+    def page(self, table, params):
+        rows = self.tables[table]
+        if params.get("sort") == "updated_at":
+            rows = sorted(rows, key=lambda row: row["updated_at"]["datetime"], reverse=params.get("order") == "desc")
+        limit = min(int(params.get("limit", 50)), self.page_max)
+        offset = int(params.get("offset", 0))
+        return {"total": len(rows), "rows": rows[offset:offset + limit]}
+
+def create_app(services: FakeServices) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/{table}")
+    async def snipeit(table: str, request: Request):
+        if table not in services.tables:
+            return JSONResponse(status_code=404, content={"status": "error"})
+        await asyncio.sleep(services.snipeit_latency)
+        services.counters["snipeit_pages"] += 1
+        return services.page(table, request.query_params)
+
+    @app.post("/oauth2/token")
+    async def token():
+        return {"access_token": uuid.uuid4().hex, "expires_in": 3600, "token_type": "Bearer"}
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        services.counters["completions"] += 1
+        messages = body.get("messages", [])
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in messages)
+        cached_tokens = services.cached_tokens(messages)
+        words = [f" word{k}" for k in range(services.openai_tokens)]
+        services.counters["tokens"] += prompt_tokens + len(words)
+        services.counters["cached_tokens"] += cached_tokens
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words),
+                 "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model")}
+
+        if not body.get("stream"):
+            await asyncio.sleep(services.openai_latency + services.openai_token_interval * len(words))
+            return {**base, "object": "chat.completion", "usage": usage,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "".join(words).strip()}}]}
+
+        async def stream():
+            await asyncio.sleep(services.openai_latency)
+            for word in words:
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(services.openai_token_interval)
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v3/conversations/{conversation_id}/activities/{activity_id}")
+    async def post_activity(conversation_id: str, activity_id: str, request: Request):
+        activity = await request.json()
+        await asyncio.sleep(services.bot_latency)
+        if activity.get("type") == "message":
+            services.counters["bot_posts"] += 1
+            services.replies[activity.get("replyToId")] = time.time()
+        return {"id": uuid.uuid4().hex}
+
+    @app.put("/v3/conversations/{conversation_id}/activities/{activity_id}")
+    async def update_activity(conversation_id: str, activity_id: str, request: Request):
+        activity = await request.json()
+        await asyncio.sleep(services.bot_latency)
+        services.counters["bot_updates"] += 1
+        services.replies[activity.get("replyToId")] = time.time()
+        return {"id": activity_id}
+
+    @app.get("/_bench/replies")
+    async def replies():
+        return {"replies": services.replies, "counters": services.counters}
+
+    return app
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Fake Snipe-IT, OpenAI and Bot Framework for benchmarks")
+    parser.add_argument("--port", type=int, default=int(os.getenv("FAKE_SERVICES_PORT", "8765")))
+    parser.add_argument("--assets", type=int, default=1000)
+    parser.add_argument("--snipeit-latency", type=float, default=0.02)
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="seconds to the first token")
+    parser.add_argument("--openai-tokens", type=int, default=60)
+    parser.add_argument("--openai-token-interval", type=float, default=0.01)
+    parser.add_argument("--bot-latency", type=float, default=0.03)
+    args = parser.parse_args()
+    services = FakeServices(assets=args.assets, snipeit_latency=args.snipeit_latency,
+                            openai_latency=args.openai_latency, openai_tokens=args.openai_tokens,
+                            openai_token_interval=args.openai_token_interval, bot_latency=args.bot_latency)
+    uvicorn.run(create_app(services), host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# bench/run.py
+"""Offline benchmark: startup time, loader and carrier-ingest latency, and /chat throughput.
+
+Everything the app talks to is served by bench.fake_services, started in a
+subprocess for each inventory size, so no real Snipe-IT, OpenAI or Azure
+credentials are needed and nothing leaves the machine.
+
+    python -m bench.run --sizes 1000,10000,100000 --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# A mix of fast-path questions, questions that need the LLM, and repeats the answer cache should catch
+QUESTIONS = (
+    "how many smartphones are deployed",
+    "list tablets at Fire Station 24",
+    "what does User 17 have",
+    "who has asset 00042",
+    "which laptops in Public Works are still pending and who should we follow up with?",
+    "summarize the hotspot situation at Rosehill",
+    "are there any phones on a carrier bill that nobody seems to be using?",
+    "which laptops in Public Works are still pending and who should we follow up with?",
+)
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def summarize(values):
+    return {"n": len(values), "p50": percentile(values, 50), "p99": percentile(values, 99),
+            "mean": statistics.fmean(values) if values else None}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def configure_environment(port):
+    """Point the app at the fake services. Must run before anything in app/ is imported."""
+    base = f"http://127.0.0.1:{port}"
+    for key in ("SNIPE_IT_API_KEY", "OPENAI_API_KEY", "AZURE_BOT_APP_ID", "AZURE_BOT_APP_PASSWORD"):
+        os.environ.setdefault(key, "bench")
+    os.environ.update({
+        "SNIPE_IT_API_URL": f"{base}/api/v1",
+        "OPENAI_BASE_URL": f"{base}/v1",
+        "AZURE_AUTH_URL": f"{base}/oauth2/token",
+        "SNAPSHOT_DB": "",                    # measure cold starts; warm starts come from the store
+        "INVENTORY_REFRESH_SECONDS": "0",     # no background refresh competing with the load
+        "DEBUG": "False",
+    })
+    return base
+
+def start_fake_services(port, assets, args):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bench.fake_services", "--port", str(port), "--assets", str(assets),
+         "--snipeit-latency", str(args.snipeit_latency), "--openai-latency", str(args.openai_latency),
+         "--openai-tokens", str(args.openai_tokens), "--bot-latency", str(args.bot_latency)],
+        cwd=REPO_DIR)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/_bench/replies", timeout=1).raise_for_status()
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                raise RuntimeError("fake services exited during startup")
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("fake services did not start")
+
+def write_carrier_data(target_dir: Path, total_lines):
+    """Copies of the CSVs in data/, with their rows repeated to ``total_lines`` rows in total."""
+    from app.carrier_schemas import detect_schema
+    target_dir.mkdir(parents=True, exist_ok=True)
+    sources = []
+    for path in sorted((REPO_DIR / "data").glob("*.csv")):
+        detected = detect_schema(path)
+        if detected is None:
+            continue
+        lines = path.read_text(encoding="utf-8-sig").splitlines()
+        header, rows = lines[:detected[1] + 1], [line for line in lines[detected[1] + 1:] if line.strip()]
+        if rows:
+            sources.append((path.name, header, rows))
+    original = sum(len(rows) for _, _, rows in sources)
+    for name, header, rows in sources:
+        wanted = max(1, round(total_lines * len(rows) / original))
+        repeated = (rows * (wanted // len(rows) + 1))[:wanted]
+        (target_dir / name).write_text("\n".join(header + repeated) + "\n", encoding="utf-8")
+
+def bench_carrier(repeats):
+    from app import normalize_carrier
+    timings, rows = [], 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = len(normalize_carrier.normalize_carrier_data(use_cache=False))
+        timings.append(time.perf_counter() - started)
+    normalize_carrier.normalize_carrier_data(use_cache=True)  # fill the cache
+    started = time.perf_counter()
+    normalize_carrier.normalize_carrier_data(use_cache=True)
+    cached = time.perf_counter() - started
+    result = summarize(timings)
+    result.update(rows=rows, rows_per_second=rows / result["p50"] if result["p50"] else None, cached_seconds=cached)
+    return result
+
+async def bench_loaders(repeats):
+    from app import snipeit_api
+    loaders = {"assets": snipeit_api.get_snipeit_assets, "categories": snipeit_api.get_snipeit_categories,
+               "fieldsets": snipeit_api.get_snipeit_fieldsets, "models": snipeit_api.get_snipeit_models}
+    results = {}
+    for name, loader in loaders.items():
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            await loader()
+            timings.append(time.perf_counter() - started)
+        results[name] = summarize(timings)
+    return results
+
+async def bench_chat(service_url, size, requests, concurrency):
+    """Fire ``requests`` activities at /chat; time the acknowledgement and the finished reply."""
+    from app import main
+    from app.worker import activity_queue
+    baseline = activity_queue.counters["enqueued"], activity_queue.counters["processed"] + activity_queue.counters["failed"]
+    semaphore = asyncio.Semaphore(concurrency)
+    acks, sent, statuses = [], {}, {}
+
+    async def send(client, i):
+        activity_id = f"bench-{size}-{i}"
+        activity = {"type": "message", "id": activity_id, "text": QUESTIONS[i % len(QUESTIONS)],
+                    "serviceUrl": service_url, "conversation": {"id": f"conversation-{i % (concurrency * 2)}"},
+                    "recipient": {"id": "bot"}, "from": {"id": f"user-{i}"}}
+        async with semaphore:
+            started = time.time()
+            response = await client.post("/chat", json=activity)
+            acks.append(time.time() - started)
+            status = response.json().get("status") if response.status_code in (200, 503) else response.status_code
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "queued":
+                sent[activity_id] = started
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+        await asyncio.gather(*(send(client, i) for i in range(requests)))
+    # Replies are built by the worker pool after /chat has returned; wait for it to drain
+    while True:
+        enqueued = activity_queue.counters["enqueued"] - baseline[0]
+        handled = activity_queue.counters["processed"] + activity_queue.counters["failed"] - baseline[1]
+        if handled >= enqueued and activity_queue.in_flight == 0:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    async with httpx.AsyncClient() as client:
+        replies = (await client.get(f"{service_url}/_bench/replies")).json()["replies"]
+    end_to_end = [replies[activity_id] - sent_at for activity_id, sent_at in sent.items() if activity_id in replies]
+    return {"ack": summarize(acks), "reply": summarize(end_to_end), "requests_per_second": len(end_to_end) / elapsed,
+            "statuses": statuses, "failed": activity_queue.counters["failed"]}
+
+async def bench_size(size, args, port, work_dir):
+    from app import main, inventory, normalize_carrier
+    from app.answer_cache import answer_cache
+    from app.http_client import close_http_client
+
+    normalize_carrier.SOURCE_DIR = str(work_dir / f"data-{size}")
+    normalize_carrier.CACHE_DIR = work_dir / f"cache-{size}"
+    write_carrier_data(Path(normalize_carrier.SOURCE_DIR), max(1, int(size * args.carrier_ratio)))
+
+    result = {"assets": size}
+    result["carrier"] = await asyncio.to_thread(bench_carrier, args.repeats)
+    result["loaders"] = await bench_loaders(args.repeats)
+    await close_http_client()
+
+    inventory._swap(None)
+    answer_cache._sync_version(None)
+    started = time.perf_counter()
+    async with main.lifespan(main.app):
+        while not inventory.is_ready():
+            await asyncio.sleep(0.005)
+        result["startup_seconds"] = time.perf_counter() - started
+        result["chat"] = await bench_chat(f"http://127.0.0.1:{port}", size, args.requests, args.concurrency)
+    return result
+
+async def bench_sizes(sizes, args, port, work_dir):
+    # One event loop for every size: the app's OpenAI client and semaphore are bound to the loop they first ran on
+    results = []
+    for size in sizes:
+        process = start_fake_services(port, size, args)
+        try:
+            print(f"✅ Benchmarking {size} assets")
+            results.append(await bench_size(size, args, port, work_dir))
+        finally:
+            process.terminate()
+            process.wait()
+    return results
+
+def _ms(value):
+    return f"{value * 1000:9.1f}" if value is not None else "        -"
+
+def print_report(results):
+    print(f"\n{'assets':>8} {'startup s':>10} {'carrier p50 ms':>15} {'rows/s':>10} {'assets p50 ms':>14} "
+          f"{'ack p50':>9} {'ack p99':>9} {'reply p50':>9} {'reply p99':>9} {'req/s':>8}")
+    for r in results:
+        chat = r["chat"]
+        print(f"{r['assets']:>8} {r['startup_seconds']:>10.2f} {_ms(r['carrier']['p50']):>15} "
+              f"{r['carrier']['rows_per_second'] or 0:>10.0f} {_ms(r['loaders']['assets']['p50']):>14} "
+              f"{_ms(chat['ack']['p50'])} {_ms(chat['ack']['p99'])} {_ms(chat['reply']['p50'])} "
+              f"{_ms(chat['reply']['p99'])} {chat['requests_per_second']:>8.1f}")
+    print("(latencies in ms; reply = /chat received until the last reply text reached the fake Bot Framework)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated asset counts")
+    parser.add_argument("--requests", type=int, default=200, help="/chat activities per size")
+    parser.add_argument("--concurrency", type=int, default=20, help="/chat requests in flight")
+    parser.add_argument("--repeats", type=int, default=5, help="runs of each loader and of carrier ingest")
+    parser.add_argument("--carrier-ratio", type=float, default=0.1, help="carrier lines per asset")
+    parser.add_argument("--snipeit-latency", type=float, default=0.02)
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="seconds to the first token")
+    parser.add_argument("--openai-tokens", type=int, default=60)
+    parser.add_argument("--bot-latency", type=float, default=0.03)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    port = free_port()
+    configure_environment(port)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    with tempfile.TemporaryDirectory(prefix="snipeit-bench-") as work_dir:
+        results = asyncio.run(bench_sizes(sizes, args, port, Path(work_dir)))
+    print_report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+
+# app.config refuses to import without these; the tests never talk to the real services
+for name in ("SNIPE_IT_API_KEY", "OPENAI_API_KEY", "AZURE_BOT_APP_ID", "AZURE_BOT_APP_PASSWORD"):
+    os.environ.setdefault(name, "test")
@@ -0,0 +1,51 @@
+# tests/test_answer_cache.py
+import asyncio
+from app.answer_cache import AnswerCache
+
+def test_answers_are_keyed_by_normalized_question_and_version():
+    cache = AnswerCache(maxsize=10, ttl=60, max_bytes=1_000_000)
+    cache.put("how many iphones", 1, "42")
+    assert cache.get("how many iphones", 1) == "42"
+    # A newer snapshot version drops every answer
+    assert cache.get("how many iphones", 2) is None
+    assert cache.get("how many iphones", 1) is None
+    assert cache.stats()["invalidations"] == 1
+
+    async def compute():
+        return "7"
+    assert asyncio.run(cache.get_or_compute("How many  iPhones?", 2, compute)) == "7"
+    assert cache.get("how many iphones", 2) == "7"
+
+def test_concurrent_misses_share_one_computation():
+    cache = AnswerCache(maxsize=10, ttl=60, max_bytes=1_000_000)
+    calls = []
+
+    async def compute():
+        calls.append(None)
+        await asyncio.sleep(0.01)
+        return "42"
+
+    async def ask_three_times():
+        return await asyncio.gather(*(cache.get_or_compute("how many iPhones?", 1, compute) for _ in range(3)))
+
+    assert asyncio.run(ask_three_times()) == ["42", "42", "42"]
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 2
+
+def test_failed_computation_is_not_cached():
+    cache = AnswerCache(maxsize=10, ttl=60, max_bytes=1_000_000)
+
+    async def fail():
+        raise RuntimeError("OpenAI is down")
+
+    async def compute():
+        return "42"
+
+    async def ask():
+        try:
+            await cache.get_or_compute("how many iphones", 1, fail)
+        except RuntimeError:
+            pass
+        return await cache.get_or_compute("how many iphones", 1, compute)
+
+    assert asyncio.run(ask()) == "42"
@@ -0,0 +1,39 @@
+# tests/test_asset_store.py
+from app.asset_store import AssetStore
+
+FIELDS_BY_MODEL = {1: ("IMEI", "Phone Number")}
+
+def make_asset(i, **changes):
+    asset = {"id": i, "name": f"Asset {i}", "asset_tag": f"{i:05d}", "serial": f"SN{i}", "model": "iPhone 13",
+             "model_id": 1, "category": "Smartphone", "status": "deployed", "assigned_to": f"User {i}",
+             "location": "City Hall", "last_checkout": None, "updated_at": "2025-01-01 00:00:00",
+             "custom_fields": {"IMEI": {"field": "_snipeit_imei_1", "value": f"35{i:013d}"}}}
+    asset.update(changes)
+    return asset
+
+def make_store():
+    return AssetStore([make_asset(i) for i in range(1, 4)], FIELDS_BY_MODEL)
+
+def test_is_current():
+    store = make_store()
+    assert store.is_current(make_asset(2))
+    assert not store.is_current(make_asset(2, location="Rosehill"))
+    assert not store.is_current(make_asset(2, custom_fields={"IMEI": {"value": "350000000000000"}}))
+    assert not store.is_current(make_asset(9))
+
+def test_merged_replaces_in_place_and_appends():
+    store = make_store()
+    merged = store.merged([make_asset(2, location="Rosehill", assigned_to="Jane Doe"), make_asset(4)])
+    assert [asset.id for asset in merged] == [1, 2, 3, 4]
+    assert merged.by_id(2).location == "Rosehill"
+    assert merged.is_current(make_asset(2, location="Rosehill", assigned_to="Jane Doe"))
+    assert merged.count("location", "rosehill") == 1
+    assert [asset.id for asset in merged.find("assigned_to", "Jane Doe")] == [2]
+    assert merged.find("assigned_to", "User 2") == []
+    assert merged.by_tag("00004").custom_values() == {"IMEI": "35" + "4".zfill(13)}
+    # The original store is untouched
+    assert store.by_id(2).location == "City Hall" and len(store) == 3
+
+def test_merged_without_changes_is_the_same_store():
+    store = make_store()
+    assert store.merged([]) is store
@@ -0,0 +1,25 @@
+# tests/test_carrier_schemas.py
+from app.carrier_schemas import detect_schema
+
+def detect(tmp_path, text):
+    path = tmp_path / "export.csv"
+    path.write_text(text, encoding="utf-8")
+    return detect_schema(path)
+
+def test_header_on_first_row(tmp_path):
+    schema, offset = detect(tmp_path, "Mobile Number,Device User,DAC,IMEI,SIM\n4255550199,Jane,IT,IMEI:1,SIM:2\n")
+    assert (schema.name, offset) == ("tmobile", 0)
+
+def test_header_after_report_title(tmp_path):
+    text = ("Wireless Usage Report - March\n"
+            "Mobile Number,Username,Device ID,SIM ID,Cost Center\n"
+            "4255550199,Jane,356938035643809,89014103211118510720,IT\n")
+    schema, offset = detect(tmp_path, text)
+    assert (schema.name, offset) == ("verizon", 1)
+
+def test_byte_order_mark_and_padding(tmp_path):
+    schema, _ = detect(tmp_path, "\ufeff Wireless number , Wireless user name ,Device IMEI\n")
+    assert schema.name == "att_phones"
+
+def test_unknown_export(tmp_path):
+    assert detect(tmp_path, "Phone,Owner\n4255550199,Jane\n") is None
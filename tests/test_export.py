@@ -0,0 +1,22 @@
+# tests/test_export.py
+import pytest
+from app.export import ExportError, parse_export_params
+
+def test_defaults():
+    assert parse_export_params([]) == ("ndjson", None, None, {})
+
+def test_options_and_repeated_filters():
+    params = [("format", "csv"), ("fields", "asset_tag, serial,,location"), ("limit", "50"),
+              ("location", "City Hall"), ("location", "Rosehill"), ("status", "deployed")]
+    assert parse_export_params(params) == (
+        "csv", ["asset_tag", "serial", "location"], 50,
+        {"location": ["City Hall", "Rosehill"], "status": ["deployed"]})
+
+@pytest.mark.parametrize("params", [
+    [("format", "xlsx")],
+    [("limit", "ten")],
+    [("limit", "-1")],
+])
+def test_bad_options(params):
+    with pytest.raises(ExportError):
+        parse_export_params(params)
@@ -0,0 +1,23 @@
+# tests/test_prompt_context.py
+from app.asset_store import AssetStore
+from app.prompt_context import PromptContext
+
+def make_asset(i, location="City Hall", updated_at="2025-01-01 00:00:00"):
+    return {"id": i, "name": f"Laptop-{i}", "asset_tag": f"{i:05d}", "serial": f"SN{i}", "model": "Latitude 5440",
+            "model_id": 1, "category": "Laptop", "status": "deployed", "assigned_to": f"User {i}",
+            "location": location, "updated_at": updated_at, "custom_fields": {}}
+
+def test_unchanged_rows_are_reused():
+    first = PromptContext(AssetStore([make_asset(1), make_asset(2)]), [], [])
+    second = PromptContext(AssetStore([make_asset(1), make_asset(2, updated_at="2025-02-01 00:00:00")]), [], [],
+                           previous=first)
+    assert first.rendered_assets == 2
+    assert second.rendered_assets == 0
+
+def test_renamed_location_is_rendered_again():
+    # Renaming a location doesn't touch the updated_at of the assets in it
+    first = PromptContext(AssetStore([make_asset(1), make_asset(2)]), [], [])
+    store = AssetStore([make_asset(1, location="Civic Center"), make_asset(2)])
+    second = PromptContext(store, [], [], previous=first)
+    assert second.rendered_assets == 1
+    assert "Civic Center" in second.asset_row(store.by_id(1))[0]
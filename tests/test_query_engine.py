@@ -0,0 +1,85 @@
+# tests/test_query_engine.py
+from types import SimpleNamespace
+import pytest
+from app.asset_store import AssetStore
+from app.query_engine import answer_query, message_subject, parse_query
+
+CATEGORIES = ("Laptop", "Tablet", "Smartphone", "Hotspot")
+LOCATIONS = ("City Hall", "Rosehill", "Fire Station 24")
+
+def parse(message):
+    return parse_query(message, CATEGORIES, LOCATIONS)
+
+# Questions the fast path should answer, and what it should take from them
+@pytest.mark.parametrize("message, intent, expected", [
+    ("how many laptops do we have?", "count", dict(category="Laptop")),
+    ("How many tablets are there", "count", dict(category="Tablet")),
+    ("how many deployed smartphones are at City Hall", "count",
+     dict(category="Smartphone", status="deployed", location="City Hall")),
+    ("how many assets are unassigned", "count", dict(unassigned=True)),
+    ("total devices at Rosehill", "count", dict(location="Rosehill")),
+    ("how many laptops are in use", "count", dict(category="Laptop", status="deployed")),
+    ("list broken tablets", "list", dict(category="Tablet", status="undeployable")),
+    ("show me the first 5 laptops at Fire Station 24", "list",
+     dict(category="Laptop", location="Fire Station 24", limit=5)),
+    ("which smartphones are not assigned", "list", dict(category="Smartphone", unassigned=True)),
+    ("what does Jane Doe have?", "user", dict(user="Jane Doe")),
+    ("assets assigned to John Smith", "user", dict(user="John Smith")),
+    ("how many assets does User 17 have", "user", dict(user="User 17")),
+])
+def test_fast_path_questions(message, intent, expected):
+    query = parse(message)
+    assert query is not None and query.intent == intent
+    for field, value in expected.items():
+        assert getattr(query, field) == value
+
+# Questions with a clause the fast path can't honour: they must go to the LLM
+@pytest.mark.parametrize("message", [
+    "how many laptops does User 17 have",
+    "how many tablets are assigned to User 2",
+    "how many smartphones were purchased in 2023",
+    "how many assets are not in City Hall",
+    "how many laptops were checked out last week",
+    "how many laptops have their warranty expired",
+    "list tablets older than 3 years",
+    "which laptops at Rosehill belong to the police department",
+    "how many laptops are deployed and how many are broken",
+    "show tablets except the ones at City Hall",
+    "what is the most common laptop model",
+    "number of hotspots in storage",
+    "how many",
+    "list everything",
+])
+def test_questions_for_the_llm(message):
+    assert parse(message) is None
+
+# What a question names on its own; a follow-up that names something gets fresh rows, not the session's
+@pytest.mark.parametrize("message, subject", [
+    ("is it deployed?", None),
+    ("who has those?", None),
+    ("and the serial?", None),
+    ("what does he have?", "he"),
+    ("and the laptops at City Hall?", "Laptop"),
+    ("what about Rosehill", "Rosehill"),
+    ("what about asset tag 12345", "12345"),
+    ("what about IMEI 356938035643809", "356938035643809"),
+    ("is it assigned to Jane Doe", "Jane Doe"),
+])
+def test_message_subject(message, subject):
+    assert message_subject(message, CATEGORIES, LOCATIONS) == subject
+
+def make_asset(i, category, location, assigned_to):
+    return {"id": i, "name": f"{category}-{i}", "asset_tag": f"{i:05d}", "serial": f"SN{i}", "model": "Model 1",
+            "model_id": 1, "category": category, "status": "deployed", "assigned_to": assigned_to,
+            "location": location, "updated_at": "2025-01-01 00:00:00", "custom_fields": {}}
+
+def test_counts_match_the_filters():
+    store = AssetStore([
+        make_asset(1, "Laptop", "City Hall", "User 17"),
+        make_asset(2, "Laptop", "Rosehill", "User 2"),
+        make_asset(3, "Tablet", "City Hall", "Unassigned"),
+    ])
+    snapshot = SimpleNamespace(assets=store)
+    assert answer_query("how many laptops at City Hall", snapshot) == "There are 1 Laptop(s) at City Hall."
+    assert answer_query("how many laptops does User 17 have", snapshot) is None
+    assert answer_query("how many assets are not in City Hall", snapshot) is None
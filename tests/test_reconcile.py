@@ -0,0 +1,30 @@
+# tests/test_reconcile.py
+import pytest
+from app.reconcile import imei_key, luhn_valid, sim_key
+
+def test_luhn():
+    assert luhn_valid("356938035643809")
+    assert not luhn_valid("356938035643808")
+
+@pytest.mark.parametrize("value, key", [
+    ("356938035643809", "35693803564380"),        # 15 digits, valid check digit
+    ("35-693803-564380-9", "35693803564380"),     # formatting is ignored
+    ("356938035643808", None),                    # 15 digits, bad check digit
+    ("35693803564380", "35693803564380"),         # 14 digits, no check digit
+    ("3569380356438012", "35693803564380"),       # 16-digit IMEISV
+    ("12345", None),
+    ("UNKNOWN", None),
+    (None, None),
+])
+def test_imei_key(value, key):
+    assert imei_key(value) == key
+
+@pytest.mark.parametrize("value, key", [
+    ("89014103211118510720", "8901410321111851072"),   # 20 digits: check digit dropped
+    ("8901410321111851072", "8901410321111851072"),    # 19 digits
+    ("8901 4103 2111 1851 0720", "8901410321111851072"),
+    ("890141032111185", None),
+    (None, None),
+])
+def test_sim_key(value, key):
+    assert sim_key(value) == key
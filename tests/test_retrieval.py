@@ -0,0 +1,28 @@
+# tests/test_retrieval.py
+from app.asset_store import AssetStore
+from app.normalize_carrier import CarrierLine
+from app.reconcile import build_reconciliation
+from app.retrieval import RetrievalIndex
+
+def make_asset(i, serial, assigned_to):
+    return {"id": i, "name": f"MK-{i}", "asset_tag": f"{i:05d}", "serial": serial, "model": "iPhone 13",
+            "model_id": 1, "category": "Smartphone", "status": "deployed", "assigned_to": assigned_to,
+            "location": "City Hall", "updated_at": "2025-01-01 00:00:00", "custom_fields": {}}
+
+IMEI = "356938035643809"
+
+def make_index():
+    store = AssetStore([make_asset(1, IMEI, "Jane Doe"), make_asset(2, "C02XYZ", "John Smith")])
+    lines = [CarrierLine(IMEI, "89014103211118510720", "4253140628", "Jane's iPhone", "Verizon", "IT"),
+             CarrierLine("UNKNOWN", "UNKNOWN", "4255550199", "Spare hotspot", "AT&T", "UNKNOWN")]
+    return RetrievalIndex(store, lines, build_reconciliation(lines, store))
+
+def test_line_found_by_phone_brings_its_asset():
+    assets, lines = make_index().search("whose phone is 425-314-0628", 5)
+    assert lines[0]["Phone Number"] == "4253140628"
+    assert [asset.assigned_to for asset in assets][:1] == ["Jane Doe"]
+
+def test_asset_found_by_tag_brings_its_line():
+    assets, lines = make_index().search("who has asset 00001", 5)
+    assert assets[0].id == 1
+    assert any(line["IMEI"] == IMEI for line in lines)
@@ -0,0 +1,41 @@
+# tests/test_sessions.py
+import pytest
+from app.sessions import SessionStore, is_follow_up, names_own_subject
+
+CATEGORIES = ("Laptop", "Tablet", "Smartphone")
+LOCATIONS = ("City Hall", "Rosehill")
+
+# (question, is it a follow-up, does it name its own subject)
+@pytest.mark.parametrize("message, follow_up, own_subject", [
+    ("is it deployed?", True, False),
+    ("who has those?", True, False),
+    ("and the serial?", True, False),
+    ("what does he have?", True, False),
+    ("which of those are at City Hall?", True, True),
+    ("what about Rosehill?", True, True),
+    ("what about the laptops?", True, True),
+    ("and asset tag 12345?", True, True),
+    ("how many laptops are deployed", False, True),
+    ("IT department laptops", False, True),
+    ("list everything", False, False),
+])
+def test_follow_up_cues(message, follow_up, own_subject):
+    assert is_follow_up(message) == follow_up
+    assert names_own_subject(message, CATEGORIES, LOCATIONS) == own_subject
+
+def test_old_turns_are_compacted():
+    store = SessionStore(maxsize=10, ttl=60, max_bytes=1_000_000, max_turns=2, max_rows=5)
+    for i in range(4):
+        store.record("c1", f"question {i}", f"answer {i}")
+    session = store.get("c1")
+    assert [q for q, _ in session.turns] == ["question 2", "question 3"]
+    assert len(session.summary) == 2
+    assert session.history()[0]["role"] == "system"
+    assert store.stats()["compactions"] == 2
+
+def test_least_recent_conversation_is_evicted():
+    store = SessionStore(maxsize=2, ttl=60, max_bytes=1_000_000, max_turns=2, max_rows=5)
+    for conversation in ("a", "b", "c"):
+        store.record(conversation, "q", "a")
+    assert store.get("a") is None and store.get("c") is not None
+    assert store.stats()["evictions"] == 1
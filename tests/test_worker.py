@@ -0,0 +1,62 @@
+# tests/test_worker.py
+import asyncio
+from app.worker import ActivityQueue
+
+def activity(activity_id, conversation_id):
+    return {"id": activity_id, "conversation": {"id": conversation_id}}
+
+async def drain(queue):
+    while queue.depth or queue.in_flight:
+        await asyncio.sleep(0.001)
+
+def test_conversation_order_and_duplicates():
+    handled = []
+
+    async def handle(act):
+        await asyncio.sleep(0.001)
+        handled.append(act["id"])
+
+    async def run():
+        queue = ActivityQueue(workers=4, maxsize=10, dedup_window=10)
+        queue.start(handle)
+        results = [queue.enqueue(activity(f"a{i}", "chat-a")) for i in range(3)]
+        results.append(queue.enqueue(activity("b0", "chat-b")))
+        results.append(queue.enqueue(activity("a1", "chat-a")))   # Bot Framework retry while queued
+        await drain(queue)
+        results.append(queue.enqueue(activity("a0", "chat-a")))   # ... and after it was handled
+        await queue.stop()
+        return results
+
+    assert asyncio.run(run()) == ["queued"] * 4 + ["duplicate"] * 2
+    assert [act_id for act_id in handled if act_id.startswith("a")] == ["a0", "a1", "a2"]
+    assert sorted(handled) == ["a0", "a1", "a2", "b0"]
+
+def test_failed_activity_is_redelivered():
+    attempts = []
+
+    async def handle(act):
+        attempts.append(act["id"])
+        if len(attempts) == 1:
+            raise RuntimeError("Snipe-IT timed out")
+
+    async def run():
+        queue = ActivityQueue(workers=1, maxsize=10, dedup_window=10)
+        queue.start(handle)
+        queue.enqueue(activity("a0", "chat-a"))
+        await drain(queue)
+        result = queue.enqueue(activity("a0", "chat-a"))
+        await drain(queue)
+        await queue.stop()
+        return result, queue.stats()
+
+    result, stats = asyncio.run(run())
+    assert result == "queued" and attempts == ["a0", "a0"]
+    assert (stats["failed"], stats["processed"]) == (1, 1)
+
+def test_full_queue_rejects():
+    async def run():
+        queue = ActivityQueue(workers=0, maxsize=2, dedup_window=10)
+        queue.start(None)
+        return [queue.enqueue(activity(f"a{i}", "chat-a")) for i in range(3)]
+
+    assert asyncio.run(run()) == ["queued", "queued", "full"]